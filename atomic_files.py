@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+
+def create_temp_file(path):
+    """Create an empty, uniquely named file next to path and return its name
+
+    The name is unique even between threads of one process, so two
+    writers of the same path never share a temporary file. It lives in
+    the same directory, so os.replace onto path stays atomic.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                    dir=directory)
+    os.close(fd)
+    return tmp_file
+
+
+def write_atomic(path, data):
+    """Replace path with data, a str or bytes, all at once
+
+    Readers see either the old file or the complete new one, never a
+    partial write, even if the process dies halfway.
+    """
+    tmp_file = create_temp_file(path)
+    try:
+        with open(tmp_file, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    except BaseException:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,165 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import time
+
+
+def lttb(xs, ys, threshold):
+    """Downsample a series with Largest-Triangle-Three-Buckets
+
+    Keeps the first and last points and, from each of threshold - 2
+    equal buckets in between, the point forming the largest triangle
+    with the point kept from the previous bucket and the average of the
+    next bucket. The shape of the line survives far better than with
+    plain striding. Returns (xs, ys) arrays.
+    """
+    count = len(xs)
+    if threshold >= count or threshold < 3:
+        return array('d', xs), array('d', ys)
+
+    out_x = array('d', [xs[0]])
+    out_y = array('d', [ys[0]])
+    bucket_size = (count - 2) / (threshold - 2)
+    a_x, a_y = xs[0], ys[0]
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        stop = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the triangle's third corner
+        next_start = stop
+        next_stop = min(int((bucket + 2) * bucket_size) + 1, count)
+        span = next_stop - next_start
+        c_x = sum(xs[next_start:next_stop]) / span
+        c_y = sum(ys[next_start:next_stop]) / span
+
+        # Twice the triangle area, up to sign; constant terms dropped
+        dx = a_x - c_x
+        dy = c_y - a_y
+        best_area = -1.0
+        best = start
+        for i in range(start, stop):
+            area = abs(dx * (ys[i] - a_y) + dy * (xs[i] - a_x))
+            if area > best_area:
+                best_area = area
+                best = i
+        a_x, a_y = xs[best], ys[best]
+        out_x.append(a_x)
+        out_y.append(a_y)
+
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+class SeriesPyramid:
+    """Multi-resolution copies of a series for fast pan and zoom
+
+    Level 0 is the full series and each further level is an LTTB
+    reduction of the one before by factor. A view is cut from the finest
+    level that has at most factor points per pixel in the visible range,
+    so redrawing costs about the same at any zoom, and the last few views
+    are remembered for redraws that change nothing.
+    """
+
+    def __init__(self, xs, ys, factor=8, min_points=4096, cache_size=8):
+        self.factor = factor
+        self.levels = [(array('d', xs), array('d', ys))]
+        while len(self.levels[-1][0]) > min_points * factor:
+            level_x, level_y = self.levels[-1]
+            self.levels.append(lttb(level_x, level_y, len(level_x) // factor))
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def __len__(self):
+        return len(self.levels[0][0])
+
+    def x_range(self):
+        """Return the first and last x of the series"""
+        xs = self.levels[0][0]
+        return (xs[0], xs[-1]) if xs else (0.0, 0.0)
+
+    def view(self, x_min, x_max, width):
+        """Return at most width points covering x_min..x_max"""
+        width = max(3, int(width))
+        key = (x_min, x_max, width)
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            return result
+
+        budget = width * self.factor
+        for xs, ys in self.levels:
+            # One point either side keeps the line running off the edges
+            lo = max(0, bisect_left(xs, x_min) - 1)
+            hi = min(len(xs), bisect_right(xs, x_max) + 1)
+            if hi - lo <= budget:
+                break
+        result = lttb(xs[lo:hi], ys[lo:hi], width)
+
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+
+def price_series(trades, symbol):
+    """Return (times, prices) arrays for one symbol of a trade store or log"""
+    times = array('d')
+    prices = array('d')
+    symbol_id = trades.symbol_ids_by_name.get(symbol)
+    if symbol_id is None:
+        return times, prices
+    if hasattr(trades, 'symbol_ids'):
+        symbol_ids = trades.symbol_ids
+        for row in range(len(trades)):
+            if symbol_ids[row] == symbol_id:
+                times.append(trades.times[row])
+                prices.append(trades.prices[row])
+        return times, prices
+    # A trade log is read a page at a time straight from its map
+    for start in range(0, len(trades), 65536):
+        for timestamp, price, _, record_symbol, _ in trades.page(start, start + 65536):
+            if record_symbol == symbol_id:
+                times.append(timestamp)
+                prices.append(price)
+    return times, prices
+
+
+def main(argv=None):
+    """Time pyramid building and per-frame views on a random walk"""
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description="MR Trade chart downsampling benchmark")
+    parser.add_argument('--points', type=int, default=1000000, help="series length")
+    parser.add_argument('--width', type=int, default=1280, help="chart width in pixels")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    xs = array('d', range(args.points))
+    ys = array('d')
+    price = 100.0
+    for _ in range(args.points):
+        price += rng.gauss(0, 0.1)
+        ys.append(price)
+
+    start = time.perf_counter()
+    pyramid = SeriesPyramid(xs, ys)
+    print(f"pyramid for {args.points} points: {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"levels {[len(level_x) for level_x, _ in pyramid.levels]}")
+
+    timings = []
+    for zoom in (1, 2, 8, 64, 1000):
+        span = args.points / zoom
+        for step in range(10):
+            x_min = (args.points - span) * step / 10
+            start = time.perf_counter()
+            pyramid.view(x_min, x_min + span, args.width)
+            timings.append((zoom, time.perf_counter() - start))
+    for zoom in (1, 2, 8, 64, 1000):
+        worst = max(seconds for z, seconds in timings if z == zoom)
+        print(f"zoom x{zoom:<5} worst view {worst * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,794 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import csv
+import io
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+from passwords import PasswordHasher
+from snapshots import SCHEMA_VERSION, upgrade_snapshot, write_snapshot_file
+from storage import (
+    DEFAULT_SHARD_COUNT, INDEXED_FIELDS, USER_FIELDS, ConflictError, FileLock, ShardedStorage,
+    lookup_key, open_storage, read_manifest, shard_files, shard_of,
+)
+
+
+DEFAULT_DB_FILE = "users_db.json"
+
+
+class PersistenceWorker(threading.Thread):
+    """Background thread that writes queued user records in batches"""
+
+    def __init__(self, storage, max_pending=256, max_batch=512):
+        super().__init__(name="PersistenceWorker", daemon=True)
+        self.storage = storage
+        self.max_batch = max_batch
+        # Bounded so a stalled disk pushes back on producers
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.start()
+
+    def submit(self, record, on_done, new_only=False):
+        """Queue a record; on_done(error) runs on this thread once written
+
+        new_only records are rejected with ConflictError if another process
+        stored the same email first.
+        """
+        self.queue.put((record, on_done, new_only))
+
+    def run(self):
+        """Drain the queue, turning everything pending into one write"""
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            running = None not in batch
+            self.write_batch([item for item in batch if item is not None])
+            for _ in batch:
+                self.queue.task_done()
+
+    def write_batch(self, items):
+        """Write a batch, keeping only the newest record per email"""
+        if not items:
+            return
+        created = {}
+        updated = {}
+        for record, _, new_only in items:
+            (created if new_only else updated)[record['email']] = record
+        conflicts = set()
+        try:
+            if created:
+                conflicts.update(self.storage.put_many(list(created.values()), new_only=True))
+            if updated:
+                self.storage.put_many(list(updated.values()))
+            error = None
+        except Exception as e:
+            error = e
+        for record, on_done, new_only in items:
+            if error is None and new_only and record['email'] in conflicts:
+                on_done(ConflictError("User already exists"))
+            else:
+                on_done(error)
+
+    def flush(self):
+        """Block until every queued record has been written"""
+        self.queue.join()
+
+    def close(self):
+        """Write everything still queued and stop the thread"""
+        if self.is_alive():
+            self.queue.put(None)
+            self.join()
+
+
+class AvailabilityChecker:
+    """Answers whether an email, username or phone is still free
+
+    Lookups run on their own worker thread and answers are kept in a
+    small LRU cache. Starting a check for a field cancels the previous one
+    if it has not run yet, and answers to superseded checks are dropped
+    rather than delivered.
+    """
+
+    def __init__(self, db, max_entries=1024, free_ttl=30.0):
+        self.db = db
+        self.max_entries = max_entries
+        # Someone else may register a free value; taken ones stay taken
+        self.free_ttl = free_ttl
+        # (field, lookup key) -> (available, time answered)
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.generations = {}
+        self.in_flight = {}
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Availability")
+
+    def cache_key(self, field, value):
+        """Return the cache key for a value"""
+        if field == 'email':
+            return field, value.strip()
+        return field, lookup_key(field, value)
+
+    def cached(self, key):
+        """Return a cached answer that is still trustworthy, or None"""
+        with self.cache_lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            available, answered = entry
+            if available and time.monotonic() - answered > self.free_ttl:
+                del self.cache[key]
+                return None
+            self.cache.move_to_end(key)
+            return available
+
+    def remember(self, key, available):
+        """Cache an answer, evicting the least recently used ones"""
+        with self.cache_lock:
+            self.cache[key] = (available, time.monotonic())
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def mark_taken(self, user_data):
+        """Record that a new account now uses its email, username and phone"""
+        for field in ('email',) + INDEXED_FIELDS:
+            key = self.cache_key(field, user_data.get(field) or "")
+            if key[1]:
+                self.remember(key, False)
+
+    def check(self, field, value, callback):
+        """Look up value and call callback(field, value, available)
+
+        Call from the thread callbacks are dispatched to. Cached answers
+        are delivered straight away.
+        """
+        key = self.cache_key(field, value)
+        generation = self.generations.get(field, 0) + 1
+        self.generations[field] = generation
+        previous = self.in_flight.pop(field, None)
+        if previous is not None:
+            previous.cancel()
+
+        available = self.cached(key)
+        if available is not None:
+            callback(field, value, available)
+            return
+
+        future = self.pool.submit(self.lookup, field, value, key)
+        self.in_flight[field] = future
+
+        def on_done(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            self.db.dispatch(self.deliver, field, generation, callback, value, future.result())
+
+        future.add_done_callback(on_done)
+
+    def lookup(self, field, value, key):
+        """Ask the database whether value is free and cache the answer"""
+        if field == 'email':
+            available = not self.db.user_exists(key[1])
+        else:
+            available = not self.db.find_emails(field, value)
+        self.remember(key, available)
+        return available
+
+    def deliver(self, field, generation, callback, value, available):
+        """Pass on an answer unless a newer check has started since"""
+        if self.generations.get(field) != generation:
+            return
+        self.in_flight.pop(field, None)
+        callback(field, value, available)
+
+    def close(self):
+        """Drop queued checks and stop the worker"""
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class DatabaseManager:
+    def __init__(self, db_file=DEFAULT_DB_FILE, storage=None, dispatch=None):
+        self.db_file = db_file
+        self.storage = storage or open_storage(db_file)
+        # Runs completion callbacks; the app routes them to its main thread
+        self.dispatch = dispatch or (lambda callback, *args: callback(*args))
+        # Records accepted but not yet written, visible to lookups meanwhile
+        self.pending = {}
+        # New accounts whose password is still being hashed, by email
+        self.reserved = {}
+        self.lock = threading.Lock()
+        # New accounts still on the hashing pool; flush() waits for none
+        self.hashing = 0
+        self.hashing_done = threading.Condition(self.lock)
+        self.worker = PersistenceWorker(self.storage)
+
+        # Password hashing is deliberately slow, so it runs off the UI thread
+        self.hasher = PasswordHasher()
+        self.hash_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="PasswordHash")
+        self.hash_pool.submit(self.hasher.calibrate)
+
+        # Live checks while the user types, kept apart from slow hashing
+        self.availability = AvailabilityChecker(self)
+
+    def flush(self):
+        """Wait until every accepted change is on disk"""
+        with self.lock:
+            self.hashing_done.wait_for(lambda: not self.hashing)
+        self.worker.flush()
+
+    def close(self):
+        """Flush pending hashes and writes and release storage files"""
+        self.availability.close()
+        self.hash_pool.shutdown(wait=True)
+        self.worker.close()
+        self.storage.close()
+
+    def run_async(self, function, args, callback, failure_message):
+        """Run function on the hashing pool and dispatch its result"""
+        def on_done(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = (False, f"{failure_message}: {e}")
+            self.dispatch(callback, *result)
+
+        self.hash_pool.submit(function, *args).add_done_callback(on_done)
+
+    def refresh(self):
+        """Merge changes other processes made to the database"""
+        self.storage.refresh()
+
+    def persist(self, record, success_message, callback=None, new_only=False):
+        """Hand a record to the write-behind worker"""
+        email = record['email']
+        with self.lock:
+            self.pending[email] = record
+
+        def on_done(error):
+            with self.lock:
+                if self.pending.get(email) is record:
+                    del self.pending[email]
+            if callback:
+                if error is None:
+                    self.dispatch(callback, True, success_message)
+                elif isinstance(error, ConflictError):
+                    self.dispatch(callback, False, str(error))
+                else:
+                    self.dispatch(callback, False, f"Could not save user: {error}")
+
+        self.worker.submit(record, on_done, new_only)
+
+    def get_record(self, email):
+        """Return the newest record for email, including unwritten ones"""
+        with self.lock:
+            record = self.pending.get(email)
+        if record is None:
+            self.refresh()
+            record = self.storage.get(email)
+        return record
+
+    def hash_password(self, password):
+        """Hash password for security"""
+        return self.hasher.hash(password)
+
+    def create_user(self, user_data, callback=None):
+        """Create new user account
+
+        The account is accepted immediately; its password is hashed on the
+        hashing pool and the record written in the background, after which
+        callback(success, message) is dispatched.
+        """
+        email = user_data['email']
+
+        # Check if user already exists
+        self.refresh()
+        with self.lock:
+            if email in self.pending or email in self.reserved or self.storage.contains(email):
+                return False, "User already exists"
+
+        # Usernames and phone numbers belong to one account each
+        message = self.taken_field_message(user_data)
+        if message:
+            return False, message
+        with self.lock:
+            self.reserved[email] = user_data
+            self.hashing += 1
+        self.availability.mark_taken(user_data)
+
+        # Hash the password off the UI thread, then add user to database
+        try:
+            self.hash_pool.submit(self.store_new_user, user_data, callback)
+        except RuntimeError as e:
+            # The pool is shut down, so store_new_user will never release these
+            self.release_reservation(email)
+            return False, f"Could not create user: {e}"
+        return True, "User created successfully"
+
+    def store_new_user(self, user_data, callback):
+        """Hash a new account's password and queue it for writing"""
+        try:
+            record = dict(user_data, password=self.hash_password(user_data['password']))
+            self.persist(record, "User created successfully", callback, new_only=True)
+        except Exception as e:
+            if callback:
+                self.dispatch(callback, False, f"Could not create user: {e}")
+        finally:
+            self.release_reservation(user_data['email'])
+
+    def release_reservation(self, email):
+        """Forget a new account's reservation once its hashing has ended"""
+        with self.lock:
+            self.reserved.pop(email, None)
+            self.hashing -= 1
+            if not self.hashing:
+                self.hashing_done.notify_all()
+
+    def verify_login(self, email, password, callback=None):
+        """Verify user login credentials
+
+        Without a callback this blocks and returns (success, message).
+        With one, the check runs on the hashing pool and the result is
+        dispatched as callback(success, message).
+        """
+        if callback is not None:
+            self.run_async(self.check_login, (email, password), callback, "Login failed")
+            return None
+        return self.check_login(email, password)
+
+    def check_login(self, email, password):
+        """Check credentials, upgrading outdated password hashes"""
+        with self.lock:
+            record = self.pending.get(email)
+        if record is not None:
+            stored = record['password']
+        else:
+            # Only the hash is fetched; the whole record is read for a rehash
+            self.refresh()
+            stored = self.storage.get_password(email)
+        if stored is None:
+            return False, "User not found"
+
+        matches, needs_rehash = self.hasher.verify(password, stored)
+        if not matches:
+            return False, "Incorrect password"
+
+        if needs_rehash:
+            # Legacy SHA-256 or low-cost entry: store a fresh salted hash
+            record = self.get_record(email)
+            if record is not None:
+                self.persist(dict(record, password=self.hash_password(password)), None)
+        return True, "Login successful"
+
+    def set_password(self, email, password):
+        """Replace a user's password, e.g. after a reset
+
+        Hashing blocks, so this is called from the hashing pool.
+        """
+        record = self.get_record(email)
+        if record is None:
+            return False, "User not found"
+        self.persist(dict(record, password=self.hash_password(password)), None)
+        return True, "Password changed"
+
+    def user_exists(self, email):
+        """Check if user exists"""
+        with self.lock:
+            if email in self.pending or email in self.reserved:
+                return True
+        self.refresh()
+        return self.storage.contains(email)
+
+    def get_user_data(self, email):
+        """Get user data by email
+
+        Stored accounts are compact UserRecords; callers get a plain dict
+        copy they are free to change.
+        """
+        return dict(self.get_record(email) or {})
+
+    def unsaved_records(self):
+        """Return accounts accepted but not yet in storage
+
+        Called with self.lock held.
+        """
+        return list(self.pending.values()) + list(self.reserved.values())
+
+    def find_emails(self, field, value):
+        """Return emails of users whose indexed field matches value"""
+        key = lookup_key(field, value)
+        if not key:
+            return []
+        with self.lock:
+            emails = [record['email'] for record in self.unsaved_records()
+                      if lookup_key(field, record.get(field)) == key]
+        self.refresh()
+        for email in self.storage.find(field, value):
+            # A pending update may have changed the stored value
+            if email not in emails and email not in self.pending:
+                emails.append(email)
+        return emails
+
+    def find_by_username(self, username):
+        """Return a copy of the account using username, ignoring case, or None"""
+        return self.find_user('username', username)
+
+    def find_by_phone(self, phone):
+        """Return a copy of the account using a phone number, ignoring formatting, or None"""
+        return self.find_user('phone', phone)
+
+    def find_user(self, field, value):
+        """Return a copy of the account whose indexed field matches value, or None"""
+        for email in self.find_emails(field, value):
+            # Accounts still being hashed count too, as they do in search_users
+            with self.lock:
+                record = self.pending.get(email) or self.reserved.get(email)
+            if record is None:
+                record = self.storage.get(email)
+            if record is not None:
+                return public_record(record)
+        return None
+
+    def search_users(self, field, prefix, limit=10):
+        """Return up to limit accounts whose username or phone starts with prefix"""
+        key = lookup_key(field, prefix)
+        if not key:
+            return []
+        with self.lock:
+            unsaved = {record['email']: record for record in self.unsaved_records()}
+        self.refresh()
+        # Stored matches may be outdated by an unsaved change; ask for spares
+        emails = self.storage.find_prefix(field, prefix, limit + len(unsaved))
+        records = [unsaved.get(email) or self.storage.get(email) for email in emails]
+        records += [record for email, record in unsaved.items() if email not in emails]
+        records = [record for record in records
+                   if record and lookup_key(field, record.get(field)).startswith(key)]
+        records.sort(key=lambda record: (lookup_key(field, record.get(field)), record['email']))
+        return [public_record(record) for record in records[:limit]]
+
+    def taken_field_message(self, user_data, seen=()):
+        """Return why user_data's username or phone cannot be used, or None"""
+        labels = {'username': "Username already taken", 'phone': "Phone number already registered"}
+        for field in INDEXED_FIELDS:
+            key = lookup_key(field, user_data.get(field))
+            if not key:
+                continue
+            if (field, key) in seen:
+                return labels[field]
+            if any(email != user_data['email'] for email in self.find_emails(field, key)):
+                return labels[field]
+        return None
+
+    def validate_user(self, user_data, seen):
+        """Return an error message for an unusable import record, or None"""
+        email = user_data.get('email') or ""
+        if "@" not in email:
+            return "Invalid email address"
+        if not user_data.get('password'):
+            return "Missing password"
+        if ('email', email) in seen or self.user_exists(email):
+            return "User already exists"
+        return self.taken_field_message(user_data, seen)
+
+    def create_users(self, users, hashed=False):
+        """Create many accounts with parallel hashing and one durable write
+
+        users is any iterable of user dicts; anything else in it, such as
+        the ValueError read_users yields for a line it cannot decode, is
+        rejected in place. With hashed=True passwords are taken as stored
+        hashes (e.g. from export_users) instead of being hashed again.
+        Returns (created, errors) where errors lists (position, email,
+        message) for every rejected record.
+
+        Validation stays on this thread: whether a record is a duplicate
+        depends on the records before it, and its lookups take
+        microseconds next to a password hash.
+        """
+        accepted = []
+        errors = []
+        seen = set()
+        for position, user_data in enumerate(users, 1):
+            if isinstance(user_data, ValueError):
+                message = getattr(user_data, 'msg', str(user_data))
+                errors.append((position, "", f"Unreadable record: {message}"))
+                continue
+            if not isinstance(user_data, dict):
+                errors.append((position, "", "Not a user object"))
+                continue
+            # Numbers and other JSON values are taken as their text
+            user_data = {field: "" if user_data.get(field) is None else str(user_data[field])
+                         for field in USER_FIELDS}
+            message = self.validate_user(user_data, seen)
+            if message:
+                errors.append((position, user_data['email'], message))
+                continue
+            seen.add(('email', user_data['email']))
+            for field in INDEXED_FIELDS:
+                seen.add((field, lookup_key(field, user_data[field])))
+            accepted.append(user_data)
+
+        if not hashed:
+            # PBKDF2 releases the GIL, so threads hash on every core
+            with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as pool:
+                passwords = pool.map(self.hash_password, [user['password'] for user in accepted])
+                for user_data, password in zip(accepted, passwords):
+                    user_data['password'] = password
+
+        if accepted:
+            # Keep ordering with writes already queued by the app
+            self.flush()
+            self.storage.put_many(accepted)
+        return len(accepted), errors
+
+    def export_users(self, format='jsonl'):
+        """Stream every stored account as JSON lines or CSV text"""
+        if format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=USER_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for record in self.storage.iter_records():
+                writer.writerow(record)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for record in self.storage.iter_records():
+                yield json.dumps(record) + "\n"
+
+
+def public_record(record):
+    """Return a dict copy of an account without its password
+
+    Accounts that are still being hashed hold the password in plain text,
+    so lookups never hand the field out.
+    """
+    return {field: value for field, value in record.items() if field != 'password'}
+
+
+def read_users(path, format):
+    """Stream user dicts from a JSON lines or CSV file
+
+    A line that is not valid JSON is yielded as its ValueError, so the
+    import can report it and go on with the next one.
+    """
+    with open(path, newline='') as f:
+        if format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        yield e
+
+
+def file_format(path, format=None):
+    """Pick the import/export format from an option or file extension"""
+    if format:
+        return format
+    return 'csv' if path and path.lower().endswith('.csv') else 'jsonl'
+
+
+def migrate(source_file, target_file, batch_size=1000):
+    """Copy every user from one database file into another"""
+    source = open_storage(source_file)
+    target = open_storage(target_file)
+    copied = 0
+    try:
+        batch = []
+        for record in source.iter_records():
+            batch.append(record)
+            if len(batch) >= batch_size:
+                target.put_many(batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            target.put_many(batch)
+            copied += len(batch)
+    finally:
+        source.close()
+        target.close()
+    return copied
+
+
+def upgrade(db_file):
+    """Stream JSON snapshots into the current schema without loading them
+
+    Works on a JSON database or on every shard of a *.shards directory.
+    Returns (snapshot, old version, records written, records quarantined)
+    per snapshot file.
+    """
+    if db_file.lower().endswith('.shards'):
+        manifest = read_manifest(db_file)
+        paths = shard_files(db_file, manifest['shards']) if manifest else []
+    else:
+        paths = [db_file]
+    results = []
+    for path in paths:
+        if os.path.exists(path):
+            # The same lock JsonFileStorage writes under
+            with FileLock(path + ".lock"):
+                results.append((path,) + upgrade_snapshot(path))
+    return results
+
+
+def reshard(db_dir, shard_count):
+    """Change the number of shards of a sharded database"""
+    storage = ShardedStorage(db_dir)
+    try:
+        old_count = storage.shard_count
+        storage.reshard(shard_count)
+        return old_count, storage.count()
+    finally:
+        storage.close()
+
+
+def benchmark_storage(user_count, directory, shard_count=DEFAULT_SHARD_COUNT, writes=50):
+    """Compare one JSON snapshot with a sharded database of user_count users
+
+    Both layouts are written straight to snapshots in directory, then
+    timed for opening, for single durable writes (the median is kept) and
+    for compacting the journal those writes left. Returns seconds per
+    layout and measurement.
+    """
+    password = PasswordHasher(iterations=1).hash("benchmark")
+    users = {}
+    for number in range(user_count):
+        email = f"user{number}@example.com"
+        users[email] = {
+            'full_name': f"User {number}",
+            'username': f"user{number}",
+            'email': email,
+            'phone': f"+1555{number:07d}",
+            'country': "United States",
+            'password': password,
+        }
+
+    json_file = os.path.join(directory, f"bench_{user_count}.json")
+    shards_dir = os.path.join(directory, f"bench_{user_count}.shards")
+    # Start from nothing left behind by an earlier run
+    shutil.rmtree(shards_dir, ignore_errors=True)
+    for path in (json_file + ".journal", json_file + ".journal.old"):
+        if os.path.exists(path):
+            os.remove(path)
+    os.replace(write_snapshot_file(json_file, users), json_file)
+    sharded = ShardedStorage(shards_dir, shard_count)
+    paths = sharded.shard_files(shard_count)
+    sharded.close()
+    buckets = [{} for _ in range(shard_count)]
+    for email, record in users.items():
+        buckets[shard_of(email, shard_count)][email] = record
+    for path, bucket in zip(paths, buckets):
+        os.replace(write_snapshot_file(path, bucket), path)
+    del users, buckets
+
+    results = {}
+    for layout, path in (('json', json_file), ('shards', shards_dir)):
+        start = time.perf_counter()
+        storage = open_storage(path)
+        opened = time.perf_counter() - start
+
+        timings = []
+        for number in range(writes):
+            email = f"new{number}@example.com"
+            record = {field: f"new{number}" for field in USER_FIELDS}
+            record.update(email=email, password=password)
+            start = time.perf_counter()
+            storage.put(record)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+
+        # The journal only ever grows by a few records here, so compact now
+        if layout == 'shards':
+            compacted = storage.shards[shard_of(email, storage.shard_count)]
+        else:
+            compacted = storage
+        start = time.perf_counter()
+        compacted.compact()
+        compact_time = time.perf_counter() - start
+        storage.close()
+        results[layout] = {'open': opened, 'write': timings[len(timings) // 2],
+                           'compact': compact_time}
+    return results
+
+
+def main(argv=None):
+    """Command line entry point for database maintenance"""
+    # Only the command line tools need argparse; keep it off app startup
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MR Trade user database tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = commands.add_parser(
+        'migrate', help="import users from one database file into another"
+    )
+    migrate_parser.add_argument('source', help="existing database, e.g. users_db.json")
+    migrate_parser.add_argument('target', help="new database, e.g. users_db.sqlite3")
+
+    import_parser = commands.add_parser('import', help="create accounts from a JSON lines or CSV file")
+    import_parser.add_argument('file', help="users to import")
+    import_parser.add_argument('--db', default=DEFAULT_DB_FILE, help="database file")
+    import_parser.add_argument('--format', choices=('jsonl', 'csv'), help="default: from extension")
+    import_parser.add_argument('--hashed', action='store_true',
+                               help="passwords are already hashed, e.g. from export")
+
+    export_parser = commands.add_parser('export', help="write every account as JSON lines or CSV")
+    export_parser.add_argument('-o', '--output', help="output file, default stdout")
+    export_parser.add_argument('--db', default=DEFAULT_DB_FILE, help="database file")
+    export_parser.add_argument('--format', choices=('jsonl', 'csv'), help="default: from extension")
+
+    upgrade_parser = commands.add_parser(
+        'upgrade', help=f"rewrite a JSON database in schema version {SCHEMA_VERSION}"
+    )
+    upgrade_parser.add_argument('db', nargs='?', default=DEFAULT_DB_FILE,
+                                help="JSON database or *.shards directory")
+
+    reshard_parser = commands.add_parser('reshard', help="change the shard count of a *.shards database")
+    reshard_parser.add_argument('db', help="sharded database directory, e.g. users_db.shards")
+    reshard_parser.add_argument('shards', type=int, help="new number of shards")
+
+    bench_parser = commands.add_parser('bench', help="time single-file and sharded storage")
+    bench_parser.add_argument('--users', type=int, nargs='+', default=[10000, 100000, 1000000])
+    bench_parser.add_argument('--shards', type=int, default=DEFAULT_SHARD_COUNT)
+    bench_parser.add_argument('--dir', default="db_bench", help="scratch directory for the files")
+
+    args = parser.parse_args(argv)
+    if args.command == 'migrate':
+        copied = migrate(args.source, args.target)
+        print(f"Migrated {copied} users from {args.source} to {args.target}")
+
+    elif args.command == 'import':
+        db = DatabaseManager(args.db)
+        try:
+            users = read_users(args.file, file_format(args.file, args.format))
+            created, errors = db.create_users(users, hashed=args.hashed)
+        finally:
+            db.close()
+        for position, email, message in errors:
+            print(f"Record {position} ({email}): {message}", file=sys.stderr)
+        print(f"Imported {created} users into {args.db}, rejected {len(errors)}")
+
+    elif args.command == 'export':
+        db = DatabaseManager(args.db)
+        output = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            for chunk in db.export_users(file_format(args.output, args.format)):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+            db.close()
+
+    elif args.command == 'upgrade':
+        for path, version, written, quarantined in upgrade(args.db):
+            print(f"{path}: schema {version} -> {SCHEMA_VERSION}, {written} users, "
+                  f"{quarantined} quarantined")
+            if quarantined:
+                print(f"  unreadable records were saved to {path}.quarantine", file=sys.stderr)
+
+    elif args.command == 'reshard':
+        old_count, users = reshard(args.db, args.shards)
+        print(f"Moved {users} users from {old_count} to {args.shards} shards in {args.db}")
+
+    elif args.command == 'bench':
+        os.makedirs(args.dir, exist_ok=True)
+        print(f"{'users':>9} {'layout':<12} {'open':>10} {'write':>10} {'compact':>10}")
+        for user_count in args.users:
+            results = benchmark_storage(user_count, args.dir, args.shards)
+            for layout, label in (('json', "single file"), ('shards', f"{args.shards} shards")):
+                timings = results[layout]
+                print(f"{user_count:>9} {label:<12} {timings['open'] * 1000:>8.0f}ms "
+                      f"{timings['write'] * 1000:>8.2f}ms {timings['compact'] * 1000:>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+from email.message import EmailMessage
+import json
+import os
+import queue
+import secrets
+import smtplib
+import threading
+import time
+
+from atomic_files import write_atomic
+from sessions import token_hash
+
+
+# A local debug server by default: python -m aiosmtpd -n -l localhost:1025
+SMTP_HOST = os.environ.get("MRTRADE_SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("MRTRADE_SMTP_PORT", "1025"))
+SMTP_USER = os.environ.get("MRTRADE_SMTP_USER")
+SMTP_PASSWORD = os.environ.get("MRTRADE_SMTP_PASSWORD")
+SMTP_STARTTLS = os.environ.get("MRTRADE_SMTP_STARTTLS") == "1"
+MAIL_FROM = os.environ.get("MRTRADE_MAIL_FROM", "MR Trade <no-reply@mrtrade.local>")
+RESET_TTL = 3600
+DEFAULT_RESET_TOKENS_FILE = "reset_tokens.json"
+
+
+class ResetTokenStore:
+    """Single-use password reset tokens that expire after ttl seconds
+
+    Only token hashes are kept. Expired tokens are removed when they are
+    looked up, and the whole store is swept at most once per ttl when
+    new tokens are issued, so no timer thread is needed. With a path the
+    tokens are saved there like sessions, so a code mailed before a
+    restart can still be used after it.
+    """
+
+    def __init__(self, path=None, ttl=RESET_TTL):
+        self.path = path
+        self.ttl = ttl
+        # token hash -> (email, expires)
+        self.tokens = {}
+        self.lock = threading.Lock()
+        # Keeps saves in order, so an older copy never replaces a newer one
+        self.save_lock = threading.Lock()
+        self.next_sweep = time.time() + ttl
+        self.load()
+
+    def load(self):
+        """Read saved tokens, dropping the ones already expired"""
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                tokens = json.load(f)
+        except (OSError, ValueError):
+            tokens = {}
+        now = time.time()
+        with self.lock:
+            for hashed, (email, expires) in tokens.items():
+                if expires > now:
+                    self.tokens[hashed] = (email, expires)
+
+    def save(self):
+        """Write the token file atomically"""
+        if self.path is None:
+            return
+        with self.save_lock:
+            with self.lock:
+                tokens = dict(self.tokens)
+            write_atomic(self.path, json.dumps(tokens))
+
+    def issue(self, email):
+        """Return a new reset token for email"""
+        token = secrets.token_urlsafe(16)
+        now = time.time()
+        with self.lock:
+            if now >= self.next_sweep:
+                self.tokens = {hashed: entry for hashed, entry in self.tokens.items()
+                               if entry[1] > now}
+                self.next_sweep = now + self.ttl
+            self.tokens[token_hash(token)] = (email, now + self.ttl)
+        self.save()
+        return token
+
+    def peek(self, token):
+        """Return the email a valid token belongs to, or None"""
+        hashed = token_hash(token)
+        with self.lock:
+            entry = self.tokens.get(hashed)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self.tokens[hashed]
+                return None
+            return entry[0]
+
+    def redeem(self, token):
+        """Use up a token, returning its email or None if it is not valid
+
+        Only the caller that removes the token gets its email, so two
+        concurrent resets cannot both use one code.
+        """
+        with self.lock:
+            entry = self.tokens.pop(token_hash(token), None)
+        if entry is None:
+            return None
+        self.save()
+        if entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+class MailSender(threading.Thread):
+    """Background thread that delivers queued emails over SMTP
+
+    Messages queued close together go out as one batch over one
+    connection, and the connection is kept open for idle_timeout seconds
+    in case more follow. Failed deliveries are retried with exponential
+    backoff before their callback is told about the error.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=SMTP_USER, password=SMTP_PASSWORD,
+                 starttls=SMTP_STARTTLS, max_batch=50, idle_timeout=30.0,
+                 max_attempts=5, backoff=1.0, timeout=10.0):
+        super().__init__(name="MailSender", daemon=True)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        # Guards closed, so nothing is queued behind the stop marker
+        self.lock = threading.Lock()
+        self.closed = False
+        self.connection = None
+        # Delivery counters, written only by this thread
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connections = 0
+        self.batches = 0
+        self.start()
+
+    def submit(self, message, on_done=None):
+        """Queue a message; on_done(error) runs on this thread afterwards
+
+        Raises RuntimeError once close() has been called, since the
+        message would never be sent.
+        """
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("the mail sender has stopped")
+            self.queue.put((message, on_done, 1))
+
+    def run(self):
+        """Send batches until close() queues the stop marker"""
+        retry = []
+        while True:
+            # Failed messages wait out their backoff before new ones block
+            timeout = self.idle_timeout
+            if retry:
+                timeout = max(0.0, min(due for due, _ in retry) - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+                if not retry:
+                    self.disconnect()
+                    continue
+
+            batch = []
+            stopping = item is False
+            if item is not None and not stopping:
+                batch.append(item)
+            while len(batch) < self.max_batch and not stopping:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is False:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            now = time.monotonic()
+            batch += [entry for due, entry in retry if due <= now or stopping]
+            retry = [(due, entry) for due, entry in retry if due > now and not stopping]
+            if batch:
+                retry += self.send_batch(batch, final=stopping)
+            if stopping:
+                self.disconnect()
+                return
+
+    def send_batch(self, batch, final=False):
+        """Send a batch over one connection; return entries to retry later"""
+        self.batches += 1
+        retry = []
+        # Set once the server cannot be reached, so the rest of the batch waits
+        down = None
+        for message, on_done, attempt in batch:
+            if message is None:
+                # A flush() marker; everything queued before it is done
+                on_done(None)
+                continue
+            error = down
+            if down is None:
+                try:
+                    self.connect().send_message(message)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                    # The server answered and reset the transaction itself
+                    error = e
+                except (smtplib.SMTPException, OSError) as e:
+                    self.disconnect()
+                    error = down = e
+            if error is None:
+                self.sent += 1
+                if on_done:
+                    on_done(None)
+                continue
+
+            # Refused recipients and 5xx replies will not change on retry
+            permanent = (isinstance(error, smtplib.SMTPRecipientsRefused)
+                         or getattr(error, 'smtp_code', 0) >= 500)
+            if attempt < self.max_attempts and not permanent and not final:
+                self.retries += 1
+                due = time.monotonic() + self.backoff * 2 ** (attempt - 1)
+                retry.append((due, (message, on_done, attempt + 1)))
+            else:
+                self.failed += 1
+                if on_done:
+                    on_done(error)
+        return retry
+
+    def connect(self):
+        """Return the open SMTP connection, opening one if needed"""
+        if self.connection is None:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    connection.starttls()
+                if self.user:
+                    connection.login(self.user, self.password)
+            except Exception:
+                connection.close()
+                raise
+            self.connection = connection
+            self.connections += 1
+        return self.connection
+
+    def disconnect(self):
+        """Close the SMTP connection if one is open"""
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (smtplib.SMTPException, OSError):
+                self.connection.close()
+            self.connection = None
+
+    def flush(self):
+        """Block until every message queued so far has been tried once"""
+        done = threading.Event()
+        with self.lock:
+            if self.closed:
+                return
+            self.queue.put((None, lambda error: done.set(), 0))
+        done.wait()
+
+    def close(self):
+        """Send what is queued, making one last attempt for retries, and stop"""
+        with self.lock:
+            stopping = not self.closed
+            self.closed = True
+            if stopping:
+                self.queue.put(False)
+        if self.is_alive():
+            self.join()
+
+
+class PasswordResetService:
+    """Issues reset tokens, mails them and redeems them for a new password
+
+    Everything that touches the database, the token file or the mail
+    thread runs on the database's hashing pool, off the UI thread.
+    """
+
+    def __init__(self, db, sessions=None, sender=None, tokens=None):
+        self.db = db
+        self.sessions = sessions
+        self.sender = sender
+        self.sender_lock = threading.Lock()
+        self.closed = False
+        if tokens is None:
+            tokens = ResetTokenStore(DEFAULT_RESET_TOKENS_FILE)
+        self.tokens = tokens
+
+    def get_sender(self):
+        """Start the mail thread the first time a reset is requested"""
+        with self.sender_lock:
+            if self.closed:
+                raise RuntimeError("mail is shut down")
+            if self.sender is None:
+                self.sender = MailSender()
+            return self.sender
+
+    def request_reset(self, email, callback=None):
+        """Check the account and queue a reset email in the background
+
+        callback(success, message) is dispatched once the email has been
+        queued; delivery itself continues on the mail thread.
+        """
+        self.db.run_async(self.queue_reset, (email,), callback or (lambda *result: None),
+                          "Could not send reset code")
+
+    def queue_reset(self, email):
+        """Create a token and hand the reset email to the mail thread"""
+        if not self.db.user_exists(email):
+            return False, "Email not found in our system"
+        sender = self.get_sender()
+        token = self.tokens.issue(email)
+        sender.submit(self.reset_message(email, token))
+        return True, f"Reset code sent to {email}"
+
+    def reset_password(self, token, password, callback=None):
+        """Redeem a reset code for a new password in the background
+
+        callback(success, message) is dispatched once the new password is
+        accepted; it is written behind like any other account change.
+        """
+        self.db.run_async(self.apply_reset, (token, password), callback or (lambda *result: None),
+                          "Could not reset password")
+
+    def apply_reset(self, token, password):
+        """Use up a reset code, store the new password and sign the user out"""
+        email = self.tokens.redeem(token)
+        if email is None:
+            return False, "This reset code is not valid or has expired"
+        success, message = self.db.set_password(email, password)
+        if not success:
+            return success, message
+        # Sessions opened with the old password end everywhere
+        if self.sessions is not None:
+            self.sessions.revoke_user(email)
+        return True, "Password changed, please log in"
+
+    def reset_message(self, email, token):
+        """Build the reset email"""
+        message = EmailMessage()
+        message['Subject'] = "Reset your MR Trade password"
+        message['From'] = MAIL_FROM
+        message['To'] = email
+        minutes = self.tokens.ttl // 60
+        message.set_content(
+            "Someone asked to reset the password of your MR Trade account.\n\n"
+            f"Your reset code is: {token}\n\n"
+            f"It expires in {minutes} minutes. If you did not ask for this, ignore this email.\n"
+        )
+        return message
+
+    def close(self):
+        """Deliver queued emails and stop the mail thread
+
+        Resets requested afterwards fail instead of starting a new sender,
+        so no one is told a code is on its way when it is not.
+        """
+        with self.sender_lock:
+            self.closed = True
+            sender = self.sender
+        if sender is not None:
+            sender.close()
+
+
+def main(argv=None):
+    """Send a burst of test emails to check delivery against a local server"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MR Trade reset email delivery test")
+    parser.add_argument('recipient', help="address the test emails go to")
+    parser.add_argument('--count', type=int, default=20, help="emails in the burst")
+    parser.add_argument('--host', default=SMTP_HOST)
+    parser.add_argument('--port', type=int, default=SMTP_PORT)
+    args = parser.parse_args(argv)
+
+    sender = MailSender(args.host, args.port, max_attempts=3, backoff=0.5)
+    errors = []
+    start = time.perf_counter()
+    for number in range(args.count):
+        message = EmailMessage()
+        message['Subject'] = f"MR Trade delivery test {number + 1}/{args.count}"
+        message['From'] = MAIL_FROM
+        message['To'] = args.recipient
+        message.set_content("This is a test of the MR Trade reset email queue.\n")
+        sender.submit(message, lambda error: error and errors.append(error))
+    queued = time.perf_counter() - start
+    sender.close()
+    elapsed = time.perf_counter() - start
+    print(f"queued {args.count} emails in {queued * 1000:.1f} ms, delivered in {elapsed * 1000:.0f} ms")
+    print(f"sent {sender.sent}, failed {sender.failed}, retries {sender.retries}, "
+          f"connections {sender.connections}, batches {sender.batches}")
+    if errors:
+        print(f"last error: {errors[-1]}")
+
+
+if __name__ == "__main__":
+    main()
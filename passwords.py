@@ -0,0 +1,333 @@
+import base64
+from collections import namedtuple
+import hashlib
+import hmac
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+
+ALGORITHM = "pbkdf2_sha256"
+# Used until calibration has measured this machine
+DEFAULT_ITERATIONS = 200000
+# Never go below this, however slow the machine is
+MIN_ITERATIONS = 100000
+# Time one hash should take on the current machine
+TARGET_HASH_SECONDS = 0.25
+
+COMMON_PASSWORDS_FILE = "common_passwords.bloom"
+
+
+def is_legacy_hash(encoded):
+    """Check for an unsalted SHA-256 hex digest from older databases"""
+    if len(encoded) != 64:
+        return False
+    try:
+        int(encoded, 16)
+    except ValueError:
+        return False
+    return True
+
+
+class PasswordHasher:
+    """Salted PBKDF2-SHA256 password hashing
+
+    hashlib releases the GIL while deriving keys, so hashes can run on
+    worker threads without holding up the UI thread.
+    """
+
+    def __init__(self, iterations=DEFAULT_ITERATIONS):
+        self.iterations = iterations
+
+    def derive(self, password, salt, iterations):
+        """Run the key derivation function"""
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+
+    def hash(self, password):
+        """Hash password with a fresh salt at the current cost"""
+        iterations = self.iterations
+        salt = os.urandom(16)
+        digest = self.derive(password, salt, iterations)
+        return "%s$%d$%s$%s" % (
+            ALGORITHM,
+            iterations,
+            base64.b64encode(salt).decode(),
+            base64.b64encode(digest).decode(),
+        )
+
+    def verify(self, password, encoded):
+        """Check password against a stored hash
+
+        Returns (matches, needs_rehash); needs_rehash is set for legacy
+        SHA-256 entries and for hashes made at a lower cost than today's.
+        """
+        if is_legacy_hash(encoded):
+            digest = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(digest, encoded), True
+
+        try:
+            algorithm, iterations, salt, digest = encoded.split("$")
+            iterations = int(iterations)
+            salt = base64.b64decode(salt)
+            digest = base64.b64decode(digest)
+        except ValueError:
+            return False, False
+        if algorithm != ALGORITHM:
+            return False, False
+
+        matches = hmac.compare_digest(self.derive(password, salt, iterations), digest)
+        # Calibration varies a little between runs; only upgrade real gaps
+        return matches, iterations < self.iterations * 3 // 4
+
+    def calibrate(self, target_seconds=TARGET_HASH_SECONDS, probe_iterations=20000):
+        """Pick the iteration count that takes target_seconds on this machine"""
+        start = time.perf_counter()
+        self.derive("calibration", b"\0" * 16, probe_iterations)
+        elapsed = max(time.perf_counter() - start, 1e-6)
+
+        iterations = int(probe_iterations * target_seconds / elapsed)
+        iterations = max(MIN_ITERATIONS, iterations // 10000 * 10000)
+        self.iterations = iterations
+        return iterations
+
+
+def asset_path(name):
+    """Locate a bundled asset, also inside a PyInstaller onefile build"""
+    base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, 'assets', name)
+
+
+class CommonPasswordFilter:
+    """Bloom filter of common passwords, read straight from a mapped file
+
+    Only the bit array is stored, so membership tests never hold the word
+    list in memory. A false positive flags an uncommon password as common
+    at about the rate the filter was built for; there are no false
+    negatives.
+    """
+
+    # magic, number of passwords, number of bits, number of hash functions
+    HEADER = struct.Struct('<8sQQI')
+    MAGIC = b'MRBLOOM1'
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.entries, self.num_bits, self.num_hashes = self.HEADER.unpack_from(self.map)
+        except (ValueError, struct.error):
+            self.file.close()
+            raise ValueError(f"{path} is not a common password filter")
+        if magic != self.MAGIC or len(self.map) < self.HEADER.size + (self.num_bits + 7) // 8:
+            self.close()
+            raise ValueError(f"{path} is not a common password filter")
+
+    @classmethod
+    def open_bundled(cls):
+        """Open the filter shipped with the app, or None if it is missing"""
+        try:
+            return cls(asset_path(COMMON_PASSWORDS_FILE))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def normalize(password):
+        """Match regardless of case and surrounding spaces"""
+        return password.strip().lower()
+
+    @staticmethod
+    def bit_positions(password, num_bits, num_hashes):
+        """Yield the bits for password using double hashing of one digest"""
+        digest = hashlib.blake2b(password.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        h2 |= 1
+        for i in range(num_hashes):
+            yield (h1 + i * h2) % num_bits
+
+    def __contains__(self, password):
+        password = self.normalize(password)
+        if not password:
+            return False
+        data = self.map
+        offset = self.HEADER.size
+        for bit in self.bit_positions(password, self.num_bits, self.num_hashes):
+            if not data[offset + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def close(self):
+        """Unmap the filter file"""
+        self.map.close()
+        self.file.close()
+
+    @classmethod
+    def build(cls, passwords, path, false_positive_rate=0.001):
+        """Write a filter sized for passwords at the given error rate"""
+        passwords = {cls.normalize(password) for password in passwords}
+        passwords.discard("")
+        entries = max(len(passwords), 1)
+        num_bits = max(64, math.ceil(-entries * math.log(false_positive_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / entries * math.log(2)))
+
+        bits = bytearray((num_bits + 7) // 8)
+        for password in passwords:
+            for bit in cls.bit_positions(password, num_bits, num_hashes):
+                bits[bit >> 3] |= 1 << (bit & 7)
+
+        with open(path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(passwords), num_bits, num_hashes))
+            f.write(bits)
+        return len(passwords)
+
+
+PasswordStrength = namedtuple('PasswordStrength', 'strength entropy_bits common')
+
+
+class PasswordStrengthScorer:
+    """Password strength estimate that is updated as the user types
+
+    Character class counts are kept between calls, so an edit only scans
+    the characters that changed rather than the whole password.
+    """
+
+    UPPER, LOWER, DIGIT, SYMBOL, OTHER = range(5)
+    SYMBOLS = frozenset("!@#$%^&*()_+-=[]{};':\"\\|,.<>/?")
+    # Alphabet size each class adds to a brute-force search
+    POOL_SIZES = (26, 26, 10, len(SYMBOLS), 32)
+
+    def __init__(self, common_passwords=None):
+        self.common_passwords = common_passwords
+        self.text = ""
+        self.counts = [0] * 5
+
+    def char_class(self, char):
+        """Return which character class char belongs to"""
+        if 'a' <= char <= 'z':
+            return self.LOWER
+        if 'A' <= char <= 'Z':
+            return self.UPPER
+        if '0' <= char <= '9':
+            return self.DIGIT
+        if char in self.SYMBOLS:
+            return self.SYMBOL
+        return self.OTHER
+
+    def update(self, text):
+        """Score text, rescanning only what changed since the last call"""
+        old = self.text
+        # Typing and deleting happen at the end; find where the texts differ
+        if text.startswith(old):
+            keep = len(old)
+        elif old.startswith(text):
+            keep = len(text)
+        else:
+            keep = 0
+            limit = min(len(old), len(text))
+            while keep < limit and old[keep] == text[keep]:
+                keep += 1
+
+        counts = self.counts
+        for char in old[keep:]:
+            counts[self.char_class(char)] -= 1
+        for char in text[keep:]:
+            counts[self.char_class(char)] += 1
+        self.text = text
+        return self.score()
+
+    def entropy_bits(self):
+        """Estimate brute-force entropy from length and classes used"""
+        pool = sum(size for size, count in zip(self.POOL_SIZES, self.counts) if count)
+        return len(self.text) * math.log2(pool) if pool else 0.0
+
+    def score(self):
+        """Return a PasswordStrength for the current text"""
+        counts = self.counts
+        strength = 0
+        if len(self.text) >= 8:
+            strength += 25
+        if counts[self.UPPER]:
+            strength += 25
+        if counts[self.LOWER]:
+            strength += 25
+        if counts[self.DIGIT] or counts[self.SYMBOL]:
+            strength += 25
+
+        entropy = self.entropy_bits()
+        common = self.common_passwords is not None and self.text in self.common_passwords
+        if common:
+            # Guessed from a word list long before any brute force
+            strength = min(strength, 25)
+            entropy = min(entropy, math.log2(max(self.common_passwords.entries, 2)))
+        return PasswordStrength(strength, entropy, common)
+
+
+def benchmark_scorer(passwords, common_passwords=None, rounds=5):
+    """Time one scorer update per simulated keystroke
+
+    Each password is typed a character at a time and then erased with
+    backspace, so both growth and shrinking are measured. Returns the
+    per-keystroke latencies in microseconds.
+    """
+    timings = []
+    for _ in range(rounds):
+        for password in passwords:
+            scorer = PasswordStrengthScorer(common_passwords)
+            keystrokes = [password[:n] for n in range(1, len(password) + 1)]
+            keystrokes += [password[:n] for n in range(len(password) - 1, -1, -1)]
+            for text in keystrokes:
+                start = time.perf_counter_ns()
+                scorer.update(text)
+                timings.append((time.perf_counter_ns() - start) / 1000)
+    return timings
+
+
+def main(argv=None):
+    """Command line tools for the common password filter"""
+    import argparse
+    import random
+    import string
+
+    parser = argparse.ArgumentParser(description="MR Trade password tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build-bloom', help="build the common password filter")
+    build_parser.add_argument('wordlist', nargs='?', default=asset_path("common_passwords.txt"),
+                              help="one password per line")
+    build_parser.add_argument('-o', '--output', default=asset_path(COMMON_PASSWORDS_FILE))
+    build_parser.add_argument('--error-rate', type=float, default=0.001,
+                              help="false positive rate, default 0.001")
+
+    bench_parser = commands.add_parser('bench', help="measure per-keystroke scoring latency")
+    bench_parser.add_argument('--count', type=int, default=1000, help="passwords to type")
+    bench_parser.add_argument('--length', type=int, default=16, help="characters per password")
+
+    args = parser.parse_args(argv)
+    if args.command == 'build-bloom':
+        with open(args.wordlist, encoding='utf-8', errors='replace') as f:
+            count = CommonPasswordFilter.build((line.rstrip("\n") for line in f),
+                                               args.output, args.error_rate)
+        print(f"Wrote {count} passwords to {args.output} "
+              f"({os.path.getsize(args.output)} bytes)")
+
+    elif args.command == 'bench':
+        alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
+        rng = random.Random(1)
+        passwords = ["".join(rng.choice(alphabet) for _ in range(args.length))
+                     for _ in range(args.count)]
+        common_passwords = CommonPasswordFilter.open_bundled()
+        timings = sorted(benchmark_scorer(passwords, common_passwords))
+        print(f"{len(timings)} keystrokes, common password filter "
+              f"{'loaded' if common_passwords else 'missing'}")
+        for label, value in (("mean", sum(timings) / len(timings)),
+                             ("p50", timings[len(timings) // 2]),
+                             ("p99", timings[len(timings) * 99 // 100]),
+                             ("max", timings[-1])):
+            print(f"  {label:<4} {value:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,45 @@
+import multiprocessing
+import sys
+
+# A frozen build starts process pool workers, e.g. for loading a sharded
+# database, by running this script again; send them off before Kivy loads.
+# Unfrozen runs never start them, since spawned workers would import Kivy.
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+
+from startup_profiler import StartupProfiler
+
+# Checked before Kivy is imported, since Kivy parses sys.argv itself
+PROFILE_STARTUP = "--profile-startup" in sys.argv
+if PROFILE_STARTUP:
+    sys.argv.remove("--profile-startup")
+profiler = StartupProfiler(enabled=PROFILE_STARTUP)
+
+# Only what LoginScreen needs is imported up front; widgets used by later
+# screens are imported when those screens are built
 from kivymd.app import MDApp
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.textfield import MDTextField
 from kivymd.uix.label import MDLabel
-from kivymd.uix.button import MDFillRoundFlatButton, MDFlatButton
+from kivymd.uix.button import MDFillRoundFlatButton
 from kivymd.uix.card import MDCard
-from kivymd.uix.datatables import MDDataTable
-from kivymd.uix.progressbar import MDProgressBar
-from kivy.uix.screenmanager import ScreenManager, Screen, SlideTransition
+from kivy.uix.screenmanager import NoTransition, ScreenManager, Screen, SlideTransition
 from kivy.metrics import dp
 from kivy.clock import Clock
-from kivy.animation import Animation
-from functools import partial
-from kivy.properties import NumericProperty, ObjectProperty, StringProperty
 from kivy.core.window import Window
-import re
-import json
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Ellipse, Rectangle
+from kivy.logger import Logger
+from kivy.properties import NumericProperty
+from kivy.uix.widget import Widget
+from collections import OrderedDict
 import os
-from hashlib import sha256
-
-
-class DatabaseManager:
-    def __init__(self):
-        self.db_file = "users_db.json"
-        self.load_database()
-
-    def load_database(self):
-        """Load database from file or create new one"""
-        if os.path.exists(self.db_file):
-            try:
-                with open(self.db_file, 'r') as f:
-                    self.users = json.load(f)
-            except:
-                self.users = {}
-        else:
-            self.users = {}
-        self.save_database()
-
-    def save_database(self):
-        """Save database to file"""
-        with open(self.db_file, 'w') as f:
-            json.dump(self.users, f, indent=4)
-
-    def hash_password(self, password):
-        """Hash password for security"""
-        return sha256(password.encode()).hexdigest()
-
-    def create_user(self, user_data):
-        """Create new user account"""
-        email = user_data['email']
-        
-        # Check if user already exists
-        if email in self.users:
-            return False, "User already exists"
-        
-        # Hash the password
-        user_data['password'] = self.hash_password(user_data['password'])
-        
-        # Add user to database
-        self.users[email] = user_data
-        self.save_database()
-        return True, "User created successfully"
-
-    def verify_login(self, email, password):
-        """Verify user login credentials"""
-        if email not in self.users:
-            return False, "User not found"
-        
-        hashed_password = self.hash_password(password)
-        if self.users[email]['password'] == hashed_password:
-            return True, "Login successful"
-        else:
-            return False, "Incorrect password"
+import time
+profiler.mark("imports (kivy)")
 
-    def user_exists(self, email):
-        """Check if user exists"""
-        return email in self.users
-
-    def get_user_data(self, email):
-        """Get user data by email"""
-        return self.users.get(email, {})
+from database import DatabaseManager, DEFAULT_DB_FILE
+from sessions import SessionStore, delete_token, read_token, write_token
+profiler.mark("imports (database)")
 
 
 class LoginScreen(Screen):
@@ -282,16 +243,22 @@ class LoginScreen(Screen):
             self.show_error("Please fill all fields")
             return
         
-        # Verify credentials with database
+        # Verify credentials with database; hashing runs in the background
         if self.app and self.app.db:
-            success, message = self.app.db.verify_login(email, password)
-            
-            if success:
-                # Login successful - navigate to data screen
-                self.app.navigate_to('data')
-            else:
-                # Login failed - show error
-                self.show_error(message)
+            self.app.db.verify_login(
+                email, password,
+                callback=lambda success, message: self.on_login_result(email, success, message),
+            )
+
+    def on_login_result(self, email, success, message):
+        """Called on the main thread once the password has been checked"""
+        if success:
+            # Login successful - remember it and navigate to data screen
+            self.app.start_session(email)
+            self.app.navigate_to('data', clear_history=True)
+        else:
+            # Login failed - show error
+            self.show_error(message)
 
     def show_error(self, message):
         """Show error message without shake animation"""
@@ -314,7 +281,133 @@ class LoginScreen(Screen):
             self.app.navigate_to('step1')
 
 
-class Step1Screen(Screen):
+class WizardProgress(Widget):
+    """Signup progress indicator drawn with a handful of canvas instructions
+
+    One instance is shared by all signup steps; moving to another step only
+    recolours the circles and connecting lines.
+    """
+
+    active_step = NumericProperty(1)
+
+    STEPS = 3
+    ACTIVE_COLOR = (0, 0, 0, 1)
+    INACTIVE_COLOR = (0.8, 0.8, 0.8, 1)
+    ACTIVE_TEXT_COLOR = (1, 1, 1, 1)
+    INACTIVE_TEXT_COLOR = (0.5, 0.5, 0.5, 1)
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('size_hint_y', None)
+        kwargs.setdefault('height', dp(80))
+        super().__init__(**kwargs)
+        self.line_colors = []
+        self.lines = []
+        self.circle_colors = []
+        self.circles = []
+        self.number_colors = []
+        self.numbers = []
+
+        with self.canvas:
+            for _ in range(self.STEPS - 1):
+                self.line_colors.append(Color())
+                self.lines.append(Rectangle())
+            for number in range(1, self.STEPS + 1):
+                self.circle_colors.append(Color())
+                self.circles.append(Ellipse())
+                # Glyphs render white and are tinted by the Color before them
+                label = CoreLabel(text=str(number), font_size=dp(20), bold=True)
+                label.refresh()
+                self.number_colors.append(Color())
+                self.numbers.append(Rectangle(texture=label.texture, size=label.texture.size))
+
+        self.bind(pos=self.update_layout, size=self.update_layout)
+        self.bind(active_step=self.update_colors)
+        self.update_layout()
+        self.update_colors()
+
+    def update_layout(self, *args):
+        """Center circles and lines in the widget"""
+        circle = dp(50)
+        line_width = dp(60)
+        line_height = dp(4)
+        total_width = self.STEPS * circle + (self.STEPS - 1) * line_width
+        x = self.center_x - total_width / 2
+        y = self.center_y - circle / 2
+
+        for index in range(self.STEPS):
+            self.circles[index].pos = (x, y)
+            self.circles[index].size = (circle, circle)
+            number = self.numbers[index]
+            number.pos = (
+                x + (circle - number.size[0]) / 2,
+                y + (circle - number.size[1]) / 2,
+            )
+            x += circle
+            if index < self.STEPS - 1:
+                self.lines[index].pos = (x, self.center_y - line_height / 2)
+                self.lines[index].size = (line_width, line_height)
+                x += line_width
+
+    def update_colors(self, *args):
+        """Highlight the steps up to the active one"""
+        for index in range(self.STEPS):
+            active = index + 1 <= self.active_step
+            self.circle_colors[index].rgba = self.ACTIVE_COLOR if active else self.INACTIVE_COLOR
+            self.number_colors[index].rgba = self.ACTIVE_TEXT_COLOR if active else self.INACTIVE_TEXT_COLOR
+            if index < self.STEPS - 1:
+                line_active = index + 2 <= self.active_step
+                self.line_colors[index].rgba = self.ACTIVE_COLOR if line_active else self.INACTIVE_COLOR
+
+
+class WizardStepScreen(Screen):
+    """Base for signup steps showing the shared progress indicator"""
+
+    step = 1
+
+    def create_progress_holder(self):
+        """Create the slot the shared progress indicator is shown in"""
+        self.progress_holder = MDBoxLayout(size_hint_y=None, height=dp(80))
+        return self.progress_holder
+
+    def on_pre_enter(self, *args):
+        """Show the shared progress indicator at this screen's step"""
+        if self.app:
+            self.app.show_wizard_progress(self.progress_holder, self.step)
+
+    def watch_availability(self, text_field, field, taken_message):
+        """Check whether a field's value is free once typing pauses"""
+        text_field.helper_text_mode = "on_error"
+        trigger = Clock.create_trigger(
+            lambda dt: self.check_availability(text_field, field, taken_message), 0.3
+        )
+
+        def restart(*args):
+            # Calling a pending trigger does not push it back; cancel it first
+            trigger.cancel()
+            trigger()
+
+        text_field.bind(text=restart)
+
+    def check_availability(self, text_field, field, taken_message):
+        """Start an availability lookup for the field's current text"""
+        value = text_field.text.strip()
+        if not value or (field == 'email' and "@" not in value) or not (self.app and self.app.db):
+            text_field.error = False
+            return
+
+        def on_result(field, checked_value, available):
+            # The user may have kept typing while the lookup ran
+            if checked_value != text_field.text.strip():
+                return
+            text_field.helper_text = "" if available else taken_message
+            text_field.error = not available
+
+        self.app.db.availability.check(field, value, on_result)
+
+
+class Step1Screen(WizardStepScreen):
+    step = 1
+
     def __init__(self, app=None, **kwargs):
         super().__init__(**kwargs)
         self.app = app
@@ -328,9 +421,8 @@ class Step1Screen(Screen):
             spacing=dp(25)
         )
 
-        # Progress Steps - Centered horizontally with step 2 at x=0.5
-        steps_layout = self.create_progress_steps(1)
-        main_layout.add_widget(steps_layout)
+        # Progress Steps - the shared indicator is moved in on_pre_enter
+        main_layout.add_widget(self.create_progress_holder())
 
         # Title
         title_label = MDLabel(
@@ -389,7 +481,9 @@ class Step1Screen(Screen):
             font_size=dp(16),
             line_color_focus=(0, 0, 0, 1),
         )
+        self.watch_availability(self.username_field, 'username', "Username already taken")
         form_card.add_widget(self.username_field)
+        self.restore_fields()
 
         main_layout.add_widget(form_card)
         main_layout.add_widget(MDBoxLayout(size_hint_y=0.1))
@@ -421,112 +515,24 @@ class Step1Screen(Screen):
         main_layout.add_widget(MDBoxLayout(size_hint_y=0.1))
         self.add_widget(main_layout)
 
-    def create_progress_steps(self, active_step):
-        """Create progress steps indicator with step 2 at center (x=0.5)"""
-        # Main container
-        main_container = MDBoxLayout(
-            orientation="horizontal",
-            size_hint_y=None,
-            height=dp(80),
-            spacing=dp(0)
-        )
-        
-        # Calculate positions to center step 2
-        # Add flexible space before steps
-        main_container.add_widget(MDBoxLayout(size_hint_x=0.2))
-        
-        # Steps container with fixed spacing
-        steps_container = MDBoxLayout(
-            orientation="horizontal",
-            size_hint_x=0.6,
-            size_hint_y=None,
-            height=dp(60),
-            spacing=dp(0),
-            pos_hint={"center_x": 0.5}
-        )
-
-        # Step 1
-        step1_active = active_step >= 1
-        step1_card = self.create_step(1, step1_active)
-        steps_container.add_widget(step1_card)
-
-        # Line between 1-2
-        line1_color = (0, 0, 0, 1) if active_step >= 2 else (0.8, 0.8, 0.8, 1)
-        line1 = self.create_connecting_line(line1_color)
-        steps_container.add_widget(line1)
-
-        # Step 2 - This will be at center
-        step2_active = active_step >= 2
-        step2_card = self.create_step(2, step2_active)
-        steps_container.add_widget(step2_card)
-
-        # Line between 2-3
-        line2_color = (0, 0, 0, 1) if active_step >= 3 else (0.8, 0.8, 0.8, 1)
-        line2 = self.create_connecting_line(line2_color)
-        steps_container.add_widget(line2)
-
-        # Step 3
-        step3_active = active_step >= 3
-        step3_card = self.create_step(3, step3_active)
-        steps_container.add_widget(step3_card)
-
-        main_container.add_widget(steps_container)
-        # Add flexible space after steps
-        main_container.add_widget(MDBoxLayout(size_hint_x=0.2))
-        
-        return main_container
-
-    def create_step(self, number, active):
-        """Create a step circle - Fully circular"""
-        if active:
-            step_card = MDCard(
-                size_hint=(None, None),
-                size=(dp(50), dp(50)),
-                elevation=3,
-                radius=[dp(25),],  # Fully circular
-                md_bg_color=(0, 0, 0, 1)
-            )
-            text_color = (1, 1, 1, 1)
-        else:
-            step_card = MDCard(
-                size_hint=(None, None),
-                size=(dp(50), dp(50)),
-                elevation=0,
-                radius=[dp(25),],  # Fully circular
-                md_bg_color=(0.8, 0.8, 0.8, 1)
-            )
-            text_color = (0.5, 0.5, 0.5, 1)
-
-        step_label = MDLabel(
-            text=str(number),
-            halign="center",
-            valign="center",
-            theme_text_color="Custom",
-            text_color=text_color,
-            bold=True,
-            font_style="H6"
-        )
-        step_card.add_widget(step_label)
-        return step_card
-
-    def create_connecting_line(self, color):
-        """Create connecting line between steps"""
-        line = MDBoxLayout(
-            size_hint=(None, None),
-            size=(dp(60), dp(4)),
-            md_bg_color=color
-        )
-        return line
+    def restore_fields(self):
+        """Refill fields from in-progress signup data after a rebuild"""
+        if self.app:
+            self.full_name_field.text = self.app.user_data.get('full_name', '')
+            self.username_field.text = self.app.user_data.get('username', '')
 
     def go_to_step2(self, instance):
-        if self.app and self.full_name_field.text.strip() and self.username_field.text.strip():
+        if (self.app and self.full_name_field.text.strip() and self.username_field.text.strip()
+                and not self.username_field.error):
             # Save data
             self.app.update_user_data('full_name', self.full_name_field.text)
             self.app.update_user_data('username', self.username_field.text)
             self.app.navigate_to('step2')
 
 
-class Step2Screen(Screen):
+class Step2Screen(WizardStepScreen):
+    step = 2
+
     def __init__(self, app=None, **kwargs):
         super().__init__(**kwargs)
         self.app = app
@@ -540,9 +546,8 @@ class Step2Screen(Screen):
             spacing=dp(25)
         )
 
-        # Progress Steps - Centered horizontally with step 2 at x=0.5
-        steps_layout = self.create_progress_steps(2)
-        main_layout.add_widget(steps_layout)
+        # Progress Steps - the shared indicator is moved in on_pre_enter
+        main_layout.add_widget(self.create_progress_holder())
 
         # Title
         title_label = MDLabel(
@@ -589,6 +594,7 @@ class Step2Screen(Screen):
             font_size=dp(16),
             line_color_focus=(0, 0, 0, 1),
         )
+        self.watch_availability(self.email_field, 'email', "An account with this email already exists")
         form_card.add_widget(self.email_field)
 
         # Phone field - numbers only with numeric keyboard
@@ -602,6 +608,7 @@ class Step2Screen(Screen):
             line_color_focus=(0, 0, 0, 1),
             input_type="number"  # Show numeric keyboard
         )
+        self.watch_availability(self.phone_field, 'phone', "Phone number already registered")
         form_card.add_widget(self.phone_field)
 
         # Country field
@@ -615,6 +622,7 @@ class Step2Screen(Screen):
             line_color_focus=(0, 0, 0, 1),
         )
         form_card.add_widget(self.country_field)
+        self.restore_fields()
 
         main_layout.add_widget(form_card)
         main_layout.add_widget(MDBoxLayout(size_hint_y=0.1))
@@ -646,105 +654,16 @@ class Step2Screen(Screen):
         main_layout.add_widget(MDBoxLayout(size_hint_y=0.1))
         self.add_widget(main_layout)
 
-    def create_progress_steps(self, active_step):
-        """Create progress steps indicator with step 2 at center (x=0.5)"""
-        # Main container
-        main_container = MDBoxLayout(
-            orientation="horizontal",
-            size_hint_y=None,
-            height=dp(80),
-            spacing=dp(0)
-        )
-        
-        # Calculate positions to center step 2
-        # Add flexible space before steps
-        main_container.add_widget(MDBoxLayout(size_hint_x=0.2))
-        
-        # Steps container with fixed spacing
-        steps_container = MDBoxLayout(
-            orientation="horizontal",
-            size_hint_x=0.6,
-            size_hint_y=None,
-            height=dp(60),
-            spacing=dp(0),
-            pos_hint={"center_x": 0.5}
-        )
-
-        # Step 1
-        step1_active = active_step >= 1
-        step1_card = self.create_step(1, step1_active)
-        steps_container.add_widget(step1_card)
-
-        # Line between 1-2
-        line1_color = (0, 0, 0, 1) if active_step >= 2 else (0.8, 0.8, 0.8, 1)
-        line1 = self.create_connecting_line(line1_color)
-        steps_container.add_widget(line1)
-
-        # Step 2 - This will be at center
-        step2_active = active_step >= 2
-        step2_card = self.create_step(2, step2_active)
-        steps_container.add_widget(step2_card)
-
-        # Line between 2-3
-        line2_color = (0, 0, 0, 1) if active_step >= 3 else (0.8, 0.8, 0.8, 1)
-        line2 = self.create_connecting_line(line2_color)
-        steps_container.add_widget(line2)
-
-        # Step 3
-        step3_active = active_step >= 3
-        step3_card = self.create_step(3, step3_active)
-        steps_container.add_widget(step3_card)
-
-        main_container.add_widget(steps_container)
-        # Add flexible space after steps
-        main_container.add_widget(MDBoxLayout(size_hint_x=0.2))
-        
-        return main_container
-
-    def create_step(self, number, active):
-        """Create a step circle - Fully circular"""
-        if active:
-            step_card = MDCard(
-                size_hint=(None, None),
-                size=(dp(50), dp(50)),
-                elevation=3,
-                radius=[dp(25),],  # Fully circular
-                md_bg_color=(0, 0, 0, 1)
-            )
-            text_color = (1, 1, 1, 1)
-        else:
-            step_card = MDCard(
-                size_hint=(None, None),
-                size=(dp(50), dp(50)),
-                elevation=0,
-                radius=[dp(25),],  # Fully circular
-                md_bg_color=(0.8, 0.8, 0.8, 1)
-            )
-            text_color = (0.5, 0.5, 0.5, 1)
-
-        step_label = MDLabel(
-            text=str(number),
-            halign="center",
-            valign="center",
-            theme_text_color="Custom",
-            text_color=text_color,
-            bold=True,
-            font_style="H6"
-        )
-        step_card.add_widget(step_label)
-        return step_card
-
-    def create_connecting_line(self, color):
-        """Create connecting line between steps"""
-        line = MDBoxLayout(
-            size_hint=(None, None),
-            size=(dp(60), dp(4)),
-            md_bg_color=color
-        )
-        return line
+    def restore_fields(self):
+        """Refill fields from in-progress signup data after a rebuild"""
+        if self.app:
+            self.email_field.text = self.app.user_data.get('email', '')
+            self.phone_field.text = self.app.user_data.get('phone', '')
+            self.country_field.text = self.app.user_data.get('country', '')
 
     def go_to_step3(self, instance):
-        if self.app and self.email_field.text.strip() and self.phone_field.text.strip():
+        if (self.app and self.email_field.text.strip() and self.phone_field.text.strip()
+                and not self.email_field.error and not self.phone_field.error):
             # Save data
             self.app.update_user_data('email', self.email_field.text)
             self.app.update_user_data('phone', self.phone_field.text)
@@ -752,7 +671,9 @@ class Step2Screen(Screen):
             self.app.navigate_to('step3')
 
 
-class Step3Screen(Screen):
+class Step3Screen(WizardStepScreen):
+    step = 3
+
     def __init__(self, app=None, **kwargs):
         super().__init__(**kwargs)
         self.app = app
@@ -766,9 +687,8 @@ class Step3Screen(Screen):
             spacing=dp(25)
         )
 
-        # Progress Steps - Centered horizontally with step 2 at x=0.5
-        steps_layout = self.create_progress_steps(3)
-        main_layout.add_widget(steps_layout)
+        # Progress Steps - the shared indicator is moved in on_pre_enter
+        main_layout.add_widget(self.create_progress_holder())
 
         # Title
         title_label = MDLabel(
@@ -817,11 +737,18 @@ class Step3Screen(Screen):
             line_color_focus=(0, 0, 0, 1),
             icon_right="eye-off",
         )
-        self.password_field.bind(text=self.check_password_strength)
+        self.password_field.bind(text=self.on_password_text)
         self.password_field.bind(on_touch_down=self.toggle_password_visibility)
         form_card.add_widget(self.password_field)
 
+        # Scoring waits for a pause in typing instead of running per keystroke
+        from passwords import CommonPasswordFilter, PasswordStrengthScorer
+        self.strength_scorer = PasswordStrengthScorer(CommonPasswordFilter.open_bundled())
+        self.strength_trigger = Clock.create_trigger(self.check_password_strength, 0.15)
+        self.shown_strength = None
+
         # Password strength bar - Circular edges
+        from kivymd.uix.progressbar import MDProgressBar
         self.strength_bar = MDProgressBar(
             value=0,
             size_hint_y=None,
@@ -897,116 +824,22 @@ class Step3Screen(Screen):
                 return True
         return False
 
-    def create_progress_steps(self, active_step):
-        """Create progress steps indicator with step 2 at center (x=0.5)"""
-        # Main container
-        main_container = MDBoxLayout(
-            orientation="horizontal",
-            size_hint_y=None,
-            height=dp(80),
-            spacing=dp(0)
-        )
-        
-        # Calculate positions to center step 2
-        # Add flexible space before steps
-        main_container.add_widget(MDBoxLayout(size_hint_x=0.2))
-        
-        # Steps container with fixed spacing
-        steps_container = MDBoxLayout(
-            orientation="horizontal",
-            size_hint_x=0.6,
-            size_hint_y=None,
-            height=dp(60),
-            spacing=dp(0),
-            pos_hint={"center_x": 0.5}
-        )
-
-        # Step 1
-        step1_active = active_step >= 1
-        step1_card = self.create_step(1, step1_active)
-        steps_container.add_widget(step1_card)
-
-        # Line between 1-2
-        line1_color = (0, 0, 0, 1) if active_step >= 2 else (0.8, 0.8, 0.8, 1)
-        line1 = self.create_connecting_line(line1_color)
-        steps_container.add_widget(line1)
-
-        # Step 2 - This will be at center
-        step2_active = active_step >= 2
-        step2_card = self.create_step(2, step2_active)
-        steps_container.add_widget(step2_card)
-
-        # Line between 2-3
-        line2_color = (0, 0, 0, 1) if active_step >= 3 else (0.8, 0.8, 0.8, 1)
-        line2 = self.create_connecting_line(line2_color)
-        steps_container.add_widget(line2)
-
-        # Step 3
-        step3_active = active_step >= 3
-        step3_card = self.create_step(3, step3_active)
-        steps_container.add_widget(step3_card)
-
-        main_container.add_widget(steps_container)
-        # Add flexible space after steps
-        main_container.add_widget(MDBoxLayout(size_hint_x=0.2))
-        
-        return main_container
-
-    def create_step(self, number, active):
-        """Create a step circle - Fully circular"""
-        if active:
-            step_card = MDCard(
-                size_hint=(None, None),
-                size=(dp(50), dp(50)),
-                elevation=3,
-                radius=[dp(25),],  # Fully circular
-                md_bg_color=(0, 0, 0, 1)
-            )
-            text_color = (1, 1, 1, 1)
-        else:
-            step_card = MDCard(
-                size_hint=(None, None),
-                size=(dp(50), dp(50)),
-                elevation=0,
-                radius=[dp(25),],  # Fully circular
-                md_bg_color=(0.8, 0.8, 0.8, 1)
-            )
-            text_color = (0.5, 0.5, 0.5, 1)
-
-        step_label = MDLabel(
-            text=str(number),
-            halign="center",
-            valign="center",
-            theme_text_color="Custom",
-            text_color=text_color,
-            bold=True,
-            font_style="H6"
-        )
-        step_card.add_widget(step_label)
-        return step_card
+    def on_password_text(self, instance, value):
+        """Restart the strength check delay on every keystroke"""
+        # Calling a pending trigger does not push it back; cancel it first
+        self.strength_trigger.cancel()
+        self.strength_trigger()
 
-    def create_connecting_line(self, color):
-        """Create connecting line between steps"""
-        line = MDBoxLayout(
-            size_hint=(None, None),
-            size=(dp(60), dp(4)),
-            md_bg_color=color
-        )
-        return line
-
-    def check_password_strength(self, instance, value):
+    def check_password_strength(self, *args):
         """Check password strength and update progress bar"""
-        strength = 0
-        color = (0.8, 0.8, 0.8, 1)  # Default gray
-
-        if len(value) >= 8:
-            strength += 25
-        if re.search(r"[A-Z]", value):
-            strength += 25
-        if re.search(r"[a-z]", value):
-            strength += 25
-        if re.search(r"[0-9!@#$%^&*()_+\-=\[\]{};':\"\\|,.<>\/?]", value):
-            strength += 25
+        result = self.strength_scorer.update(self.password_field.text)
+        strength = result.strength
+
+        # Only touch the widgets when the result changed
+        shown = (strength, result.common)
+        if shown == self.shown_strength:
+            return
+        self.shown_strength = shown
 
         self.strength_bar.value = strength
 
@@ -1021,6 +854,7 @@ class Step3Screen(Screen):
             color = (0, 0.8, 0, 1)  # Green
 
         self.strength_bar.md_bg_color = color
+        self.password_field.helper_text = "This password is too common" if result.common else ""
 
     def create_account(self, instance):
         """Final account creation and save to database"""
@@ -1038,19 +872,25 @@ class Step3Screen(Screen):
             # Get complete user data
             user_data = self.app.get_user_data()
             
-            # Save user to database
+            # Save user to database; the write finishes in the background
             if self.app.db:
-                success, message = self.app.db.create_user(user_data)
-                
-                if success:
-                    print("Account created successfully!")
-                    print("User data saved to database")
-                    
-                    # Navigate to success screen
-                    self.app.navigate_to('success')
-                else:
+                success, message = self.app.db.create_user(
+                    user_data, callback=self.on_account_saved
+                )
+                if not success:
                     print(f"Error: {message}")
 
+    def on_account_saved(self, success, message):
+        """Called on the main thread once the new account is on disk"""
+        if success:
+            print("Account created successfully!")
+            print("User data saved to database")
+
+            # Navigate to success screen
+            self.app.navigate_to('success', clear_history=True)
+        else:
+            print(f"Error: {message}")
+
 
 class SuccessScreen(Screen):
     def __init__(self, app=None, **kwargs):
@@ -1123,7 +963,9 @@ class SuccessScreen(Screen):
     def go_to_data(self, instance):
         """Navigate to data screen"""
         if self.app:
-            self.app.navigate_to('data')
+            # The new account is signed in straight away
+            self.app.start_session(self.app.user_data.get('email', ''))
+            self.app.navigate_to('data', clear_history=True)
 
 
 class ForgotPasswordScreen(Screen):
@@ -1176,7 +1018,7 @@ class ForgotPasswordScreen(Screen):
 
         # Instruction text
         instruction_label = MDLabel(
-            text="Enter your email address and we'll send you a link to reset your password",
+            text="Enter your email address and we'll send you a code to reset your password",
             halign="center",
             theme_text_color="Secondary",
             font_style="Body1",
@@ -1215,7 +1057,7 @@ class ForgotPasswordScreen(Screen):
 
         # Send reset button
         send_button = MDFillRoundFlatButton(
-            text="SEND RESET LINK",
+            text="SEND RESET CODE",
             size_hint=(None, None),
             width=dp(200),
             height=dp(50),
@@ -1242,17 +1084,18 @@ class ForgotPasswordScreen(Screen):
             self.show_error("Please enter a valid email address")
             return
         
-        # Check if user exists in database
+        # The account check and email queueing run in the background
         if self.app and self.app.db:
-            if self.app.db.user_exists(email):
-                # Simulate sending reset link
-                print(f"Reset password link sent to: {email}")
-                print(f"Success: Reset link sent to {email}")
-                
-                # Go back to login after success
-                self.app.navigate_to('login')
-            else:
-                self.show_error("Email not found in our system")
+            self.app.get_password_reset().request_reset(email, callback=self.on_reset_result)
+
+    def on_reset_result(self, success, message):
+        """Called on the main thread once the reset email is queued"""
+        if success:
+            Logger.info(f"PasswordReset: {message}")
+            # The code from the email is entered on the next screen
+            self.app.navigate_to('reset_password')
+        else:
+            self.show_error(message)
 
     def show_error(self, message):
         """Show error message"""
@@ -1260,6 +1103,153 @@ class ForgotPasswordScreen(Screen):
         self.email_field.helper_text = message
 
 
+class ResetPasswordScreen(Screen):
+    def __init__(self, app=None, **kwargs):
+        super().__init__(**kwargs)
+        self.app = app
+        self.build_ui()
+
+    def build_ui(self):
+        """Build the screen where a reset code is traded for a new password"""
+        main_layout = MDBoxLayout(
+            orientation="vertical",
+            padding=dp(20),
+            spacing=dp(25),
+            pos_hint={'center_x': 0.5, 'center_y': 0.5}
+        )
+
+        # Title
+        title_label = MDLabel(
+            text="New Password",
+            halign="center",
+            font_style="H4",
+            size_hint_y=None,
+            height=dp(60),
+            bold=True
+        )
+        main_layout.add_widget(title_label)
+
+        # Instruction text
+        instruction_label = MDLabel(
+            text="Enter the code from the email and choose a new password",
+            halign="center",
+            theme_text_color="Secondary",
+            font_style="Body1",
+            size_hint_y=None,
+            height=dp(60)
+        )
+        main_layout.add_widget(instruction_label)
+
+        # Form card
+        form_card = MDCard(
+            orientation="vertical",
+            padding=dp(30),
+            spacing=dp(25),
+            size_hint=(0.85, None),
+            height=dp(320),
+            pos_hint={"center_x": 0.5},
+            elevation=4,
+            radius=[dp(15),],
+            md_bg_color=(0.98, 0.98, 0.98, 1)
+        )
+
+        # Reset code field
+        self.code_field = MDTextField(
+            hint_text="Reset Code",
+            mode="rectangle",
+            size_hint_x=1,
+            height=dp(60),
+            icon_left="key",
+            font_size=dp(16),
+            line_color_focus=(0, 0, 0, 1),
+        )
+        form_card.add_widget(self.code_field)
+
+        # New password field
+        self.password_field = MDTextField(
+            hint_text="New Password",
+            mode="rectangle",
+            size_hint_x=1,
+            height=dp(60),
+            icon_left="lock",
+            password=True,
+            font_size=dp(16),
+            line_color_focus=(0, 0, 0, 1),
+        )
+        form_card.add_widget(self.password_field)
+
+        # Confirm password field
+        self.confirm_password_field = MDTextField(
+            hint_text="Confirm Password",
+            mode="rectangle",
+            size_hint_x=1,
+            height=dp(60),
+            icon_left="lock-check",
+            password=True,
+            font_size=dp(16),
+            line_color_focus=(0, 0, 0, 1),
+        )
+        form_card.add_widget(self.confirm_password_field)
+
+        main_layout.add_widget(form_card)
+        main_layout.add_widget(MDBoxLayout(size_hint_y=0.1))
+
+        # Reset button
+        reset_button = MDFillRoundFlatButton(
+            text="RESET PASSWORD",
+            size_hint=(None, None),
+            width=dp(200),
+            height=dp(50),
+            pos_hint={"center_x": 0.5},
+            md_bg_color=(0, 0, 0, 1),
+            text_color=(1, 1, 1, 1),
+            font_size=dp(16)
+        )
+        reset_button.bind(on_press=self.reset_password)
+        main_layout.add_widget(reset_button)
+
+        main_layout.add_widget(MDBoxLayout(size_hint_y=0.2))
+        self.add_widget(main_layout)
+
+    def reset_password(self, instance):
+        """Check the form and redeem the code in the background"""
+        code = self.code_field.text.strip()
+        password = self.password_field.text
+        self.code_field.error = False
+        self.code_field.helper_text = ""
+        self.confirm_password_field.error = False
+        self.confirm_password_field.helper_text = ""
+
+        if not code:
+            self.show_error(self.code_field, "Please enter the code from the email")
+            return
+        if not password:
+            self.show_error(self.confirm_password_field, "Please choose a new password")
+            return
+        if password != self.confirm_password_field.text:
+            self.show_error(self.confirm_password_field, "Passwords don't match")
+            return
+
+        if self.app and self.app.db:
+            self.app.get_password_reset().reset_password(code, password, callback=self.on_reset_done)
+
+    def on_reset_done(self, success, message):
+        """Called on the main thread once the new password is accepted"""
+        if success:
+            Logger.info(f"PasswordReset: {message}")
+            self.code_field.text = ""
+            self.password_field.text = ""
+            self.confirm_password_field.text = ""
+            self.app.navigate_to('login', clear_history=True)
+        else:
+            self.show_error(self.code_field, message)
+
+    def show_error(self, field, message):
+        """Show an error message under a field"""
+        field.error = True
+        field.helper_text = message
+
+
 class DataScreen(Screen):
     def __init__(self, app=None, **kwargs):
         super().__init__(**kwargs)
@@ -1271,50 +1261,268 @@ class DataScreen(Screen):
         main_layout = MDBoxLayout(orientation="vertical")
         
         # Header
+        header_layout = MDBoxLayout(
+            orientation="horizontal",
+            padding=[dp(20), 0],
+            size_hint_y=None,
+            height=dp(100)
+        )
         header = MDLabel(
             text="Welcome to MR Trade!",
             halign="center",
             valign="center",
             font_style="H4",
-            size_hint_y=None,
-            height=dp(100)
         )
-        main_layout.add_widget(header)
+        header_layout.add_widget(header)
+
+        # Logout button
+        logout_button = MDFillRoundFlatButton(
+            text="LOGOUT",
+            size_hint=(None, None),
+            width=dp(100),
+            height=dp(40),
+            pos_hint={"center_y": 0.5},
+            md_bg_color=(0, 0, 0, 1),
+            text_color=(1, 1, 1, 1),
+            font_size=dp(14)
+        )
+        logout_button.bind(on_press=self.logout)
+        header_layout.add_widget(logout_button)
+        main_layout.add_widget(header_layout)
+
+        # Live prices, refreshed once per frame from the tick buffer
+        from trade_log import TradeLog
+        from trade_widgets import PriceChart, TickerBar, TradeLogView, TradeTableView
+        self.ticker_bar = TickerBar()
+        main_layout.add_widget(self.ticker_bar)
+        self.drain_event = None
+        trades = self.app.get_trade_table()
+
+        # Price chart of the first symbol, downsampled to the chart width
+        self.price_chart = PriceChart(size_hint_y=None, height=dp(200))
+        main_layout.add_widget(self.price_chart)
+        if trades.symbols:
+            self.price_chart.show_symbol(trades, trades.symbols[0])
+
+        # Trade history - only the visible rows get widgets; a binary log
+        # is paged through instead of loaded
+        if isinstance(trades, TradeLog):
+            self.trade_view = TradeLogView(trades)
+        else:
+            self.trade_view = TradeTableView(trades)
+        main_layout.add_widget(self.trade_view)
         
         self.add_widget(main_layout)
 
+    def logout(self, instance):
+        """End the session and return to the login screen"""
+        if self.app:
+            self.app.logout()
+
+    def on_enter(self, *args):
+        """Start draining ticks while the screen is shown"""
+        if self.drain_event is None:
+            self.drain_event = Clock.schedule_interval(self.drain_ticks, 0)
+
+    def on_leave(self, *args):
+        """Stop draining ticks; the buffer keeps only the newest meanwhile"""
+        if self.drain_event is not None:
+            self.drain_event.cancel()
+            self.drain_event = None
+
+    def drain_ticks(self, dt):
+        """Apply every tick received since the last frame in one update"""
+        buffer = self.app.get_tick_buffer()
+        latest = buffer.drain_latest()
+        if latest:
+            self.ticker_bar.update(latest, buffer.stats())
+
+
+class ScreenLifecycleManager:
+    """Builds screens on demand and unloads the least recently used ones
+
+    The budget is a number of live screens and, optionally, an estimated
+    number of widgets across them. Unloaded screens are rebuilt when they
+    are visited again; signup progress lives in the app's user_data.
+    """
+
+    def __init__(self, screen_manager, screen_classes, app, max_screens=4, max_widgets=None):
+        self.screen_manager = screen_manager
+        self.screen_classes = screen_classes
+        self.app = app
+        self.max_screens = max_screens
+        self.max_widgets = max_widgets
+        # Screen name -> widget count, least recently used first
+        self.live = OrderedDict()
+
+    def get(self, screen_name):
+        """Return a screen, building it if it is not loaded"""
+        if screen_name in self.live:
+            return self.screen_manager.get_screen(screen_name)
+
+        start = time.perf_counter()
+        with profiler.phase(f"build_ui {screen_name}"):
+            screen = self.screen_classes[screen_name](name=screen_name, app=self.app)
+        screen.bind(on_leave=self.on_screen_left)
+        self.screen_manager.add_widget(screen)
+        self.live[screen_name] = sum(1 for _ in screen.walk())
+        elapsed = (time.perf_counter() - start) * 1000
+        Logger.info(f"MRTrade: built screen '{screen_name}' ({self.live[screen_name]} widgets) in {elapsed:.1f} ms")
+        return screen
+
+    def is_loaded(self, screen_name):
+        """Check if a screen is currently built"""
+        return screen_name in self.live
+
+    def touch(self, screen_name):
+        """Mark a screen as the most recently used"""
+        self.get(screen_name)
+        self.live.move_to_end(screen_name)
+
+    def on_screen_left(self, screen):
+        """Trim the loaded screens once a transition has finished"""
+        self.evict()
+
+    def over_budget(self):
+        """Check if the loaded screens exceed the budget"""
+        if len(self.live) > self.max_screens:
+            return True
+        return self.max_widgets is not None and sum(self.live.values()) > self.max_widgets
+
+    def evict(self):
+        """Unload least recently used screens until within budget"""
+        if self.screen_manager.transition.is_active:
+            return
+        for screen_name in list(self.live):
+            if not self.over_budget():
+                break
+            if screen_name == self.screen_manager.current:
+                continue
+            self.screen_manager.remove_widget(self.screen_manager.get_screen(screen_name))
+            del self.live[screen_name]
+            Logger.info(f"MRTrade: unloaded screen '{screen_name}'")
+
 
 class MRTradeApp(MDApp):
+    # Screens are only built the first time they are needed
+    SCREEN_CLASSES = {
+        'login': LoginScreen,
+        'data': DataScreen,
+        'step1': Step1Screen,
+        'step2': Step2Screen,
+        'step3': Step3Screen,
+        'success': SuccessScreen,
+        'forgot_password': ForgotPasswordScreen,
+        'reset_password': ResetPasswordScreen,
+    }
+
+    # Budget of built screens kept alive; None disables the widget limit
+    MAX_LIVE_SCREENS = 4
+    MAX_LIVE_WIDGETS = None
+
+    # Screens likely to be opened next, pre-built while the app is idle
+    LIKELY_NEXT = {
+        'login': ['step1', 'forgot_password'],
+        'step1': ['step2'],
+        'step2': ['step3'],
+        'step3': ['success'],
+        'success': ['data'],
+        'forgot_password': ['reset_password'],
+    }
+
+    # Slower frames than this switch screens without animating
+    FRAME_BUDGET = 1 / 30
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.user_data = {}
         self.screen_manager = None
-        self.db = DatabaseManager()  # Initialize database
+        # Screens to return to with back, most recent last
+        self.history = []
+        # Transitions are reused rather than created per navigation
+        self.slide_transition = SlideTransition(duration=0.05)
+        self.no_transition = NoTransition()
+        self.screens = None
+        self.wizard_progress = None
+        self.preload_queue = []
+        self.preload_event = None
+        # Loaded on first use and kept when the data screen is unloaded
+        self.trade_table = None
+        self.tick_buffer = None
+        self.tick_feed = None
+        # Built when the forgot password screen first needs it, since smtplib
+        # and the email package are not needed to show the login screen
+        self.password_reset = None
+        # Initialize database; MRTRADE_DB selects another file or backend
+        with profiler.phase("database load"):
+            self.db = DatabaseManager(
+                os.environ.get("MRTRADE_DB", DEFAULT_DB_FILE),
+                dispatch=self.run_on_main_thread,
+            )
+        # Signed-in sessions survive restarts until they expire or log out
+        self.sessions = SessionStore()
+        self.current_user = None
 
     def build(self):
         """Build the application UI"""
-        self.theme_cls.primary_palette = "Gray"
-        self.theme_cls.primary_hue = "900"
-        self.theme_cls.theme_style = "Light"
+        with profiler.phase("theme setup"):
+            self.theme_cls.primary_palette = "Gray"
+            self.theme_cls.primary_hue = "900"
+            self.theme_cls.theme_style = "Light"
 
         # Create screen manager with fast transition
-        self.screen_manager = ScreenManager()
-        self.screen_manager.transition = SlideTransition(duration=0.05)
-
-        # Add all screens
-        self.screen_manager.add_widget(LoginScreen(name='login', app=self))
-        self.screen_manager.add_widget(DataScreen(name='data', app=self))
-        self.screen_manager.add_widget(Step1Screen(name='step1', app=self))
-        self.screen_manager.add_widget(Step2Screen(name='step2', app=self))
-        self.screen_manager.add_widget(Step3Screen(name='step3', app=self))
-        self.screen_manager.add_widget(SuccessScreen(name='success', app=self))
-        self.screen_manager.add_widget(ForgotPasswordScreen(name='forgot_password', app=self))
+        self.screen_manager = ScreenManager(transition=self.slide_transition)
+        self.screens = ScreenLifecycleManager(
+            self.screen_manager,
+            self.SCREEN_CLASSES,
+            self,
+            max_screens=self.MAX_LIVE_SCREENS,
+            max_widgets=self.MAX_LIVE_WIDGETS,
+        )
+
+        # A valid saved session opens the data screen without building the
+        # login and signup screens at all
+        with profiler.phase("session check"):
+            self.current_user = self.sessions.validate(read_token())
+        first_screen = 'data' if self.current_user else 'login'
+
+        # Only the first screen is built before the first frame
+        self.screens.touch(first_screen)
+        self.schedule_preload(first_screen)
 
         # Bind back button for Android
         Window.bind(on_keyboard=self.on_back_button)
+        Window.bind(on_draw=self.on_first_frame)
 
         return self.screen_manager
 
+    def on_first_frame(self, *args):
+        """Log how long the app took to draw its first frame"""
+        Window.unbind(on_draw=self.on_first_frame)
+        profiler.mark("first frame")
+        Logger.info(f"MRTrade: first frame drawn after {profiler.elapsed() * 1000:.1f} ms")
+        if profiler.enabled:
+            print(profiler.report())
+
+    def schedule_preload(self, screen_name):
+        """Queue the screens likely to follow screen_name for idle building"""
+        self.preload_queue = [
+            name for name in self.LIKELY_NEXT.get(screen_name, [])
+            if not self.screens.is_loaded(name)
+        ]
+        if self.preload_queue and self.preload_event is None:
+            # Wait for the running transition before spending frame time
+            self.preload_event = Clock.schedule_once(self.preload_next, 0.1)
+
+    def preload_next(self, dt):
+        """Build one queued screen per idle frame"""
+        self.preload_event = None
+        if not self.preload_queue:
+            return
+        self.screens.get(self.preload_queue.pop(0))
+        if self.preload_queue:
+            self.preload_event = Clock.schedule_once(self.preload_next, 0)
+
     def on_back_button(self, window, key, *args):
         """Handle back button press on Android"""
         if key == 27:  # 27 is the keycode for Android back button
@@ -1323,35 +1531,120 @@ class MRTradeApp(MDApp):
 
     def go_back(self):
         """Navigate back to previous screen"""
-        current_screen = self.screen_manager.current
-        
-        # Define screen navigation order
-        screen_order = ['login', 'step1', 'step2', 'step3', 'success', 'forgot_password', 'data']
-        
-        try:
-            current_index = screen_order.index(current_screen)
-            
-            if current_index > 0:
-                # Go to previous screen with fast transition
-                previous_screen = screen_order[current_index - 1]
-                self.screen_manager.transition = SlideTransition(duration=0.05)
-                self.screen_manager.current = previous_screen
-                return True  # Event handled
-            else:
-                # If on login screen, show exit confirmation or do nothing
-                return True  # Event handled
-                
-        except ValueError:
-            # If current screen not in list, go to login
-            self.screen_manager.transition = SlideTransition(duration=0.05)
-            self.screen_manager.current = 'login'
-            return True  # Event handled
-
-    def navigate_to(self, screen_name):
-        """Navigate to specific screen with fast transition"""
-        self.screen_manager.transition = SlideTransition(duration=0.05)
+        if self.history:
+            self.show_screen(self.history.pop(), 'right')
+        # Nothing to go back to; keep the back button from closing the app
+        return True  # Event handled
+
+    def navigate_to(self, screen_name, clear_history=False):
+        """Navigate to specific screen with fast transition
+
+        clear_history starts a new history, e.g. after logging in or out,
+        so back does not return to screens of the finished flow.
+        """
+        current = self.screen_manager.current
+        if clear_history:
+            self.history.clear()
+        elif current and current != screen_name:
+            self.history.append(current)
+        self.show_screen(screen_name, 'left')
+        self.schedule_preload(screen_name)
+
+    def show_screen(self, screen_name, direction):
+        """Switch screens, skipping the animation when frames run late"""
+        self.screens.touch(screen_name)
+        if Clock.frametime > self.FRAME_BUDGET:
+            transition = self.no_transition
+        else:
+            transition = self.slide_transition
+            transition.direction = direction
+        if self.screen_manager.transition is not transition:
+            self.screen_manager.transition = transition
         self.screen_manager.current = screen_name
 
+    def show_wizard_progress(self, holder, step):
+        """Move the shared signup progress indicator into holder"""
+        if self.wizard_progress is None:
+            self.wizard_progress = WizardProgress()
+        progress = self.wizard_progress
+        if progress.parent is not holder:
+            if progress.parent:
+                progress.parent.remove_widget(progress)
+            holder.add_widget(progress)
+        progress.active_step = step
+
+    def start_session(self, email):
+        """Remember the signed-in user on this device"""
+        self.current_user = email
+        write_token(self.sessions.issue(email))
+
+    def logout(self):
+        """Revoke this device's session and return to the login screen"""
+        token = read_token()
+        if token:
+            self.sessions.revoke(token)
+        delete_token()
+        self.current_user = None
+        self.user_data = {}
+        self.navigate_to('login', clear_history=True)
+
+    def on_stop(self):
+        """Flush pending database writes before the app exits"""
+        if self.tick_feed is not None:
+            self.tick_feed.stop()
+        # Reset requests still on the database pool queue mail, so the pool
+        # is drained before the mail thread is stopped
+        self.db.close()
+        if self.password_reset is not None:
+            self.password_reset.close()
+
+    def run_on_main_thread(self, callback, *args):
+        """Run a callback from a worker thread on the next Kivy frame"""
+        Clock.schedule_once(lambda dt: callback(*args))
+
+    def get_password_reset(self):
+        """Return the password reset service, creating it the first time"""
+        if self.password_reset is None:
+            from password_reset import PasswordResetService
+            # Reset emails go out through a background SMTP sender
+            self.password_reset = PasswordResetService(self.db, self.sessions)
+        return self.password_reset
+
+    def get_trade_table(self):
+        """Return the trade history, opening it the first time
+
+        MRTRADE_TRADES selects the trade file. A binary .mrt log, or one
+        next to the default JSON file, is memory-mapped instead of parsed.
+        MRTRADE_DEMO_TRADES=N fills a table with N generated trades.
+        """
+        if self.trade_table is None:
+            from trades import DEFAULT_TRADES_FILE, TradeTable, generate_trades, load_trades
+            from trade_log import TRADE_LOG_EXTENSION, TradeLog
+            trades_file = os.environ.get("MRTRADE_TRADES", DEFAULT_TRADES_FILE)
+            log_file = os.path.splitext(trades_file)[0] + TRADE_LOG_EXTENSION
+            demo_rows = int(os.environ.get("MRTRADE_DEMO_TRADES", "0") or 0)
+            if demo_rows:
+                self.trade_table = TradeTable(generate_trades(demo_rows))
+            elif os.path.exists(log_file):
+                self.trade_table = TradeLog(log_file)
+            else:
+                self.trade_table = TradeTable(load_trades(trades_file))
+        return self.trade_table
+
+    def get_tick_buffer(self):
+        """Return the buffer price feeds push ticks into
+
+        MRTRADE_SIMULATED_FEED=N starts a local feed of N ticks per second.
+        """
+        if self.tick_buffer is None:
+            from ticks import SimulatedFeed, TickBuffer
+            self.tick_buffer = TickBuffer()
+            rate = int(os.environ.get("MRTRADE_SIMULATED_FEED", "0") or 0)
+            if rate:
+                self.tick_feed = SimulatedFeed(self.tick_buffer, rate=rate)
+                self.tick_feed.start()
+        return self.tick_buffer
+
     def update_user_data(self, key, value):
         """Update user data dictionary"""
         self.user_data[key] = value
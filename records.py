@@ -0,0 +1,154 @@
+from base64 import b64decode, b64encode
+from collections.abc import Mapping
+import binascii
+import sys
+
+from passwords import ALGORITHM, is_legacy_hash
+
+
+# Fields stored for every user account
+USER_FIELDS = ('full_name', 'username', 'email', 'phone', 'country', 'password')
+# Marks an unsalted SHA-256 hex digest from older databases
+LEGACY_SCHEME = "sha256"
+
+
+class UserRecord(Mapping):
+    """One stored account in a fraction of the memory of a dict
+
+    Fields live in slots instead of a per-record hash table, the country
+    and hash scheme are interned so every record shares one copy, and the
+    password hash is kept as its raw salt and digest bytes instead of
+    base64 or hex text. The record reads like the dict it was made from,
+    and password is rebuilt in the stored text form when asked for.
+    """
+
+    __slots__ = ('full_name', 'username', 'email', 'phone', 'country',
+                 'scheme', 'iterations', 'salt', 'digest')
+
+    def __init__(self, full_name, username, email, phone, country, password):
+        self.full_name = full_name
+        self.username = username
+        self.email = email
+        self.phone = phone
+        self.country = sys.intern(country)
+        self.scheme, self.iterations, self.salt, self.digest = self.pack_password(password)
+
+    @staticmethod
+    def pack_password(password):
+        """Split a stored hash into (scheme, iterations, salt, digest)
+
+        Hashes that would not come back out exactly as they went in are
+        kept as text, with no scheme.
+        """
+        packed = None
+        try:
+            if is_legacy_hash(password):
+                packed = (LEGACY_SCHEME, 0, b"", bytes.fromhex(password))
+            elif password.startswith(ALGORITHM + "$"):
+                _, iterations, salt, digest = password.split("$")
+                packed = (ALGORITHM, int(iterations), b64decode(salt, validate=True),
+                          b64decode(digest, validate=True))
+        except (ValueError, binascii.Error):
+            packed = None
+        if packed is None or UserRecord.unpack_password(*packed) != password:
+            return None, 0, b"", password
+        return packed
+
+    @staticmethod
+    def unpack_password(scheme, iterations, salt, digest):
+        """Return the stored text form of a packed hash"""
+        if scheme == ALGORITHM:
+            return "%s$%d$%s$%s" % (ALGORITHM, iterations, b64encode(salt).decode(),
+                                    b64encode(digest).decode())
+        if scheme == LEGACY_SCHEME:
+            return digest.hex()
+        return digest
+
+    @property
+    def password(self):
+        return self.unpack_password(self.scheme, self.iterations, self.salt, self.digest)
+
+    def __getitem__(self, field):
+        if field in USER_FIELDS:
+            return getattr(self, field)
+        raise KeyError(field)
+
+    def __iter__(self):
+        return iter(USER_FIELDS)
+
+    def __len__(self):
+        return len(USER_FIELDS)
+
+    def __repr__(self):
+        return f"UserRecord({self.email!r})"
+
+    def __reduce__(self):
+        return UserRecord, tuple(self[field] for field in USER_FIELDS)
+
+
+def compact_record(email, record):
+    """Return record as a UserRecord sharing the email string of its key
+
+    Records with other fields, or values that are not text, stay dicts so
+    nothing is lost when they are written back.
+    """
+    if type(record) is not dict or len(record) != len(USER_FIELDS):
+        return record
+    try:
+        values = [record[field] for field in USER_FIELDS]
+    except KeyError:
+        return record
+    if not all(type(value) is str for value in values) or values[2] != email:
+        return record
+    values[2] = email
+    return UserRecord(*values)
+
+
+def main(argv=None):
+    """Report memory per user for dict and compact records"""
+    import argparse
+    import gc
+    import tracemalloc
+
+    from passwords import PasswordHasher
+
+    parser = argparse.ArgumentParser(description="MR Trade user record memory report")
+    parser.add_argument('--users', type=int, default=1000000, help="records to build")
+    args = parser.parse_args(argv)
+
+    hasher = PasswordHasher(iterations=1)
+    countries = ("United States", "Pakistan", "India", "United Kingdom", "Germany")
+
+    def users():
+        for number in range(args.users):
+            email = f"user{number}@example.com"
+            # Fresh strings per record, as json.load would create them
+            yield email, {
+                'full_name': f"User {number}",
+                'username': f"user{number}",
+                'email': f"user{number}@example.com",
+                'phone': f"+1555{number:07d}",
+                'country': "".join(countries[number % len(countries)]),
+                'password': hasher.hash("benchmark"),
+            }
+
+    results = {}
+    for layout in ('dict', 'UserRecord'):
+        gc.collect()
+        tracemalloc.start()
+        if layout == 'dict':
+            table = dict(users())
+        else:
+            table = {email: compact_record(email, record) for email, record in users()}
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[layout] = size
+        print(f"{layout:<11} {size / args.users:7.0f} bytes per user, "
+              f"{size / 2 ** 20:7.0f} MB for {args.users} users")
+        del table
+    print(f"compact records use {results['UserRecord'] / results['dict']:.0%} of the dict memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import hashlib
+import heapq
+import json
+import os
+import secrets
+import threading
+import time
+
+from atomic_files import write_atomic
+
+DEFAULT_SESSIONS_FILE = "sessions.json"
+# Where this device keeps the token of its signed-in user
+DEFAULT_TOKEN_FILE = "session.token"
+SESSION_TTL = 30 * 24 * 3600
+
+
+def token_hash(token):
+    """Return the stored form of a token
+
+    Only hashes are written to the session store, so reading it does not
+    give anyone a usable token.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionStore:
+    """Opaque login tokens with expiry and revocation
+
+    Sessions are kept in a dict keyed by token hash, so validating a
+    token is one hash and one lookup. A heap ordered by expiry time lets
+    sweep() drop expired sessions without scanning the rest; entries for
+    revoked sessions are skipped when they reach the top.
+    """
+
+    def __init__(self, path=DEFAULT_SESSIONS_FILE, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # Keeps saves in order, so an older copy never replaces a newer one
+        self.save_lock = threading.Lock()
+        # token hash -> {'email': ..., 'expires': ...}
+        self.sessions = {}
+        self.by_email = {}
+        self.expiry_heap = []
+        self.load()
+
+    def load(self):
+        """Read stored sessions, dropping the ones already expired"""
+        try:
+            with open(self.path, 'r') as f:
+                sessions = json.load(f)
+        except (OSError, ValueError):
+            sessions = {}
+        now = time.time()
+        with self.lock:
+            for hashed, session in sessions.items():
+                if session.get('expires', 0) > now:
+                    self.add(hashed, session)
+
+    def add(self, hashed, session):
+        """Index a session; called with the lock held"""
+        self.sessions[hashed] = session
+        self.by_email.setdefault(session['email'], set()).add(hashed)
+        heapq.heappush(self.expiry_heap, (session['expires'], hashed))
+
+    def discard(self, hashed):
+        """Forget a session; called with the lock held"""
+        session = self.sessions.pop(hashed, None)
+        if session is not None:
+            hashes = self.by_email.get(session['email'])
+            if hashes is not None:
+                hashes.discard(hashed)
+                if not hashes:
+                    del self.by_email[session['email']]
+        return session
+
+    def save(self):
+        """Write the sessions file atomically"""
+        with self.save_lock:
+            with self.lock:
+                sessions = dict(self.sessions)
+            write_atomic(self.path, json.dumps(sessions))
+
+    def issue(self, email, ttl=None):
+        """Start a session for email and return its token"""
+        token = secrets.token_urlsafe(32)
+        session = {'email': email, 'expires': time.time() + (ttl or self.ttl)}
+        with self.lock:
+            self.add(token_hash(token), session)
+        self.sweep()
+        self.save()
+        return token
+
+    def validate(self, token):
+        """Return the email a token belongs to, or None if it is not valid"""
+        if not token:
+            return None
+        with self.lock:
+            session = self.sessions.get(token_hash(token))
+        if session is None or session['expires'] <= time.time():
+            return None
+        return session['email']
+
+    def revoke(self, token):
+        """End the session a token belongs to"""
+        with self.lock:
+            session = self.discard(token_hash(token))
+        if session is not None:
+            self.save()
+        return session is not None
+
+    def revoke_user(self, email):
+        """End every session of a user, e.g. after a password reset"""
+        with self.lock:
+            hashes = list(self.by_email.get(email, ()))
+            for hashed in hashes:
+                self.discard(hashed)
+        if hashes:
+            self.save()
+        return len(hashes)
+
+    def sweep(self, now=None):
+        """Drop sessions whose expiry has passed, oldest first"""
+        now = time.time() if now is None else now
+        removed = 0
+        with self.lock:
+            heap = self.expiry_heap
+            while heap and heap[0][0] <= now:
+                expires, hashed = heapq.heappop(heap)
+                session = self.sessions.get(hashed)
+                # Skip entries for sessions that were revoked already
+                if session is not None and session['expires'] == expires:
+                    self.discard(hashed)
+                    removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+def read_token(path=DEFAULT_TOKEN_FILE):
+    """Return the token saved on this device, or None"""
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_token(token, path=DEFAULT_TOKEN_FILE):
+    """Save the signed-in user's token on this device"""
+    write_atomic(path, token)
+
+
+def delete_token(path=DEFAULT_TOKEN_FILE):
+    """Forget the token saved on this device"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
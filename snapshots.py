@@ -0,0 +1,315 @@
+from json import JSONDecoder
+import json
+import os
+import re
+import time
+
+from atomic_files import create_temp_file
+from records import USER_FIELDS, compact_record
+
+
+# Layout written by write_snapshot_file:
+#   {"schema_version": 2, "users": {
+#   "<email>": {<record>},
+#   ...
+#   }}
+# Version 1 files are a bare {"<email>": {<record>}, ...} object in any layout.
+SCHEMA_VERSION = 2
+# Text read from the file at a time
+CHUNK_SIZE = 1024 * 1024
+# A record longer than this is taken to be corrupt rather than waited for
+MAX_RECORD_CHARS = 1024 * 1024
+# Space between JSON tokens
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# An email key without escapes, and what may follow a record
+MEMBER_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*')
+MEMBER_END = re.compile(r'[ \t\n\r]*([,}])')
+
+
+def upgrade_v2(email, record):
+    """Version 2: every record has every field, and the email of its key"""
+    for field in USER_FIELDS:
+        record.setdefault(field, "")
+    record['email'] = email
+    return record
+
+
+# Version -> function turning a record of that version into the next one
+MIGRATIONS = {
+    1: upgrade_v2,
+}
+
+
+class UnreadableSnapshotError(Exception):
+    """A snapshot file does not hold a user database at all"""
+
+
+class SnapshotReader:
+    """Streams (email, record) pairs out of a snapshot file of any version
+
+    The file is read a chunk at a time and each record is decoded on its
+    own, so memory use does not depend on the file size. Records are
+    migrated to SCHEMA_VERSION as they are read. A record that cannot be
+    decoded is skipped by moving on to the next line indented like the
+    records around it, and is listed in quarantined as
+    (position, error, text) instead of failing the whole file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = None
+        self.quarantined = []
+        self.decoder = JSONDecoder()
+        self.file = None
+        self.buffer = ""
+        # Buffer index of the first character still needed, and of the cursor
+        self.mark = 0
+        self.pos = 0
+        # File position of buffer[0]
+        self.start = 0
+        self.eof = False
+
+    def __iter__(self):
+        with open(self.path, 'r', encoding='utf-8') as self.file:
+            first = self.peek()
+            if not first:
+                # An empty file holds no users
+                return
+            if first != '{':
+                raise UnreadableSnapshotError(f"{self.path} is not a user database")
+
+            # Version 2 starts with its version; version 1 is the users object
+            self.mark = self.pos
+            try:
+                self.expect('{')
+                if self.decode() == 'schema_version':
+                    self.expect(':')
+                    version = self.decode()
+                    self.expect(',')
+                    if not isinstance(version, int) or self.decode() != 'users':
+                        raise ValueError("not a version 2 header")
+                    self.expect(':')
+                    self.version = version
+            except ValueError:
+                pass
+            if self.version is None:
+                self.version = 1
+                self.pos = self.mark
+            if self.version > SCHEMA_VERSION:
+                raise ValueError(f"{self.path} was written by a newer version (schema {self.version})")
+
+            for email, record in self.members():
+                for version in range(self.version, SCHEMA_VERSION):
+                    record = MIGRATIONS[version](email, record)
+                yield email, record
+
+    def fill(self, needed=1):
+        """Read until needed characters follow the cursor or the file ends"""
+        while not self.eof and len(self.buffer) - self.pos < needed:
+            chunk = self.file.read(CHUNK_SIZE)
+            if not chunk:
+                self.eof = True
+                break
+            # Drop text that is no longer needed
+            keep = min(self.mark, self.pos)
+            self.start += keep
+            self.buffer = self.buffer[keep:] + chunk
+            self.mark -= keep
+            self.pos -= keep
+
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at the end"""
+        while True:
+            self.fill()
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        """Step over char, the next non-space character"""
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} at {self.start + self.pos}")
+        self.pos += 1
+
+    def decode(self):
+        """Decode the JSON value at the cursor, reading more as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.eof or len(self.buffer) - self.pos >= MAX_RECORD_CHARS:
+                    raise
+            else:
+                # A number running into the end of the buffer may go on
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            self.fill(len(self.buffer) - self.pos + CHUNK_SIZE)
+
+    def members(self):
+        """Yield the (email, record) members of the users object"""
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        boundary = self.member_boundary()
+        while True:
+            # Fast path for a plain member that is wholly in the buffer
+            key = MEMBER_KEY.match(self.buffer, self.pos)
+            if key is not None:
+                try:
+                    record, end = self.decoder.raw_decode(self.buffer, key.end())
+                except ValueError:
+                    record = None
+                separator = MEMBER_END.match(self.buffer, end) if type(record) is dict else None
+                if separator is not None:
+                    self.pos = separator.end()
+                    yield key.group(1), record
+                    if separator.group(1) == '}':
+                        return
+                    continue
+
+            self.peek()
+            self.mark = self.pos
+            try:
+                email = self.decode()
+                self.expect(':')
+                record = self.decode()
+            except ValueError as e:
+                if not self.skip_to(boundary, e):
+                    return
+                continue
+            if isinstance(email, str) and isinstance(record, dict):
+                yield email, record
+            else:
+                # Well-formed JSON, so reading simply goes on after it
+                self.quarantined.append((self.start + self.mark, "not an object under an email",
+                                         self.buffer[self.mark:self.pos]))
+
+            next_char = self.peek()
+            if next_char == ',':
+                self.pos += 1
+            elif next_char == '}':
+                return
+            elif next_char != '"':
+                # A missing comma alone is forgiven; anything else is skipped
+                self.mark = self.pos
+                if not self.skip_to(boundary, ValueError("expected ',' between users")):
+                    return
+
+    def member_boundary(self):
+        """Return a pattern matching where the next member starts
+
+        Members are normally one per line at the indent of the first one;
+        for files with no line breaks, the end of a record object is used.
+        """
+        line_start = self.buffer.rfind("\n", 0, self.pos) + 1
+        indent = self.buffer[line_start:self.pos]
+        if line_start and not indent.strip():
+            return re.compile(r'\n' + re.escape(indent) + '(?=")')
+        return re.compile(r'\}[ \t\n\r]*,[ \t\n\r]*(?=")')
+
+    def skip_to(self, boundary, error):
+        """Quarantine the text from mark up to the next member
+
+        Returns False when the file ends first.
+        """
+        position = self.start + self.mark
+        skipped = []
+        size = 0
+        search_from = self.pos + 1
+        while True:
+            found = boundary.search(self.buffer, max(search_from, self.mark + 1))
+            if found or self.eof:
+                end = found.end() if found else len(self.buffer)
+                break
+            # The boundary may straddle the next chunk; keep a little back
+            keep = max(self.mark, len(self.buffer) - 256)
+            if size < MAX_RECORD_CHARS:
+                skipped.append(self.buffer[self.mark:keep])
+                size += keep - self.mark
+            self.mark = self.pos = keep
+            search_from = keep
+            self.fill(len(self.buffer) - self.pos + CHUNK_SIZE)
+        skipped.append(self.buffer[self.mark:end])
+        text = "".join(skipped)[:MAX_RECORD_CHARS]
+        # Decoder positions are relative to the buffer, so keep only the message
+        self.quarantined.append((position, getattr(error, 'msg', str(error)), text))
+        self.mark = self.pos = end
+        return found is not None
+
+
+def read_snapshot_file(path, compact=True):
+    """Stream a snapshot into a dict of users
+
+    Returns (users, version, quarantined); version is None when there is
+    no file. With compact, records are turned into UserRecords as they
+    are read, so the dicts never all exist at once.
+    """
+    if not os.path.exists(path):
+        return {}, None, []
+    reader = SnapshotReader(path)
+    users = {}
+    for email, record in reader:
+        users[email] = compact_record(email, record) if compact else record
+    return users, reader.version, reader.quarantined
+
+
+def write_snapshot_file(path, users):
+    """Write users next to a snapshot file and return the temporary path
+
+    users is a dict or an iterable of (email, record) pairs, written one
+    record per line in the SCHEMA_VERSION layout.
+    """
+    items = users.items() if isinstance(users, dict) else users
+    tmp_file = create_temp_file(path)
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write('{"schema_version": %d, "users": {\n' % SCHEMA_VERSION)
+        separator = ""
+        for email, record in items:
+            # Compact records are written out as the dicts they stand for
+            f.write(separator + json.dumps(email) + ": " + json.dumps(record, default=dict))
+            separator = ",\n"
+        f.write("\n}}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_file
+
+
+def quarantine_records(path, quarantined):
+    """Append records that could not be read to path.quarantine as JSON lines"""
+    if not quarantined:
+        return
+    with open(path + ".quarantine", 'a', encoding='utf-8') as f:
+        for position, error, text in quarantined:
+            f.write(json.dumps({
+                'time': time.time(),
+                'file': os.path.basename(path),
+                'position': position,
+                'error': error,
+                'text': text,
+            }) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def upgrade_snapshot(path):
+    """Stream a snapshot of any version into the current layout
+
+    Records go straight from the old file to the new one, so files too
+    large to load can be upgraded. The caller holds the database lock.
+    Returns (old version, records written, records quarantined).
+    """
+    reader = SnapshotReader(path)
+    written = 0
+
+    def records():
+        nonlocal written
+        for email, record in reader:
+            written += 1
+            yield email, record
+
+    tmp_file = write_snapshot_file(path, records())
+    quarantine_records(path, reader.quarantined)
+    os.replace(tmp_file, path)
+    return reader.version, written, len(reader.quarantined)
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+import time
+
+
+class StartupProfiler:
+    """Records how long each phase of app startup takes
+
+    Kept free of Kivy imports so it can time the Kivy imports themselves.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.last_mark = self.start
+        self.phases = []
+
+    def mark(self, name):
+        """Record the time since the previous mark as phase name"""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last_mark))
+        self.last_mark = now
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with block as phase name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases.append((name, now - start))
+            self.last_mark = now
+
+    def elapsed(self):
+        """Return seconds since the profiler was created"""
+        return time.perf_counter() - self.start
+
+    def report(self):
+        """Return the recorded phases as a printable table"""
+        width = max([len(name) for name, _ in self.phases] + [5])
+        lines = ["Startup profile:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<{width}}  {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<{width}}  {self.elapsed() * 1000:8.1f} ms")
+        return "\n".join(lines)
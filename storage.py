@@ -0,0 +1,1316 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from hashlib import blake2b
+import heapq
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+from atomic_files import create_temp_file, write_atomic
+from records import USER_FIELDS, compact_record
+from snapshots import (
+    SCHEMA_VERSION, UnreadableSnapshotError, quarantine_records, read_snapshot_file,
+    write_snapshot_file,
+)
+
+# Fields with a secondary index for lookups and uniqueness checks
+INDEXED_FIELDS = ('username', 'phone')
+# Shards in a new sharded database (a directory named *.shards)
+DEFAULT_SHARD_COUNT = 16
+# Above this many bytes of shard snapshots, a frozen build parses shards in a process pool
+PARALLEL_LOAD_BYTES = 16 * 1024 * 1024
+
+
+def lookup_key(field, value):
+    """Normalize a field value for index lookups
+
+    Usernames compare without case and phone numbers by their digits only.
+    Returns an empty string for values that are not indexed.
+    """
+    value = value or ""
+    if field == 'phone':
+        return "".join(char for char in value if char.isdigit())
+    return value.strip().casefold()
+
+
+def drop_torn_tail(f, path, end):
+    """Truncate the file at path, open as f, after its last intact record
+
+    Callers hold the file lock, so anything past end was left half-written
+    by a process that died, not a write still in progress.
+    """
+    if end < os.path.getsize(path):
+        f.truncate(end)
+
+
+class UserStorage(ABC):
+    """Interface implemented by every user storage backend"""
+
+    @abstractmethod
+    def get(self, email):
+        """Return the stored user record or None"""
+
+    @abstractmethod
+    def contains(self, email):
+        """Check if a user record is stored"""
+
+    def get_password(self, email):
+        """Return the stored password hash or None"""
+        record = self.get(email)
+        return record['password'] if record else None
+
+    @abstractmethod
+    def put_many(self, records, new_only=False):
+        """Durably store user records in a single write
+
+        With new_only, records whose email is already stored are skipped;
+        their emails are returned so the caller can report the conflict.
+        """
+
+    def put(self, record):
+        """Durably store one user record"""
+        self.put_many([record])
+
+    def split_conflicts(self, records, new_only):
+        """Separate records that would overwrite an existing user"""
+        if not new_only:
+            return records, []
+        fresh = []
+        conflicts = []
+        seen = set()
+        for record in records:
+            if record['email'] in seen or self.contains(record['email']):
+                conflicts.append(record['email'])
+            else:
+                seen.add(record['email'])
+                fresh.append(record)
+        return fresh, conflicts
+
+    def refresh(self):
+        """Pick up changes written by other processes"""
+
+    @abstractmethod
+    def find(self, field, value):
+        """Return the emails of users whose field matches value
+
+        Only INDEXED_FIELDS can be searched; values are compared by their
+        lookup_key, so usernames ignore case and phones formatting.
+        """
+
+    @abstractmethod
+    def find_prefix(self, field, prefix, limit=20):
+        """Return up to limit emails whose field starts with prefix, in value order"""
+
+    @abstractmethod
+    def iter_records(self):
+        """Yield every stored user record"""
+
+    @abstractmethod
+    def count(self):
+        """Return the number of stored users"""
+
+    def close(self):
+        """Release files and finish background work"""
+
+
+class IndexedUserStorage(UserStorage):
+    """Backend answering lookups from in-memory SecondaryIndexes
+
+    Index entries may be stale, so candidates are checked against the
+    current records before they are returned.
+    """
+
+    @abstractmethod
+    def secondary_index(self, field):
+        """Return the SecondaryIndex kept for one of INDEXED_FIELDS"""
+
+    def find(self, field, value):
+        """Return the emails of users whose field matches value"""
+        key = lookup_key(field, value)
+        if not key:
+            return []
+        candidates = self.secondary_index(field).find(key)
+        return self.verify_candidates(candidates, field, lambda found: found == key)
+
+    def find_prefix(self, field, prefix, limit=20):
+        """Return up to limit emails whose field starts with prefix, in value order"""
+        prefix = lookup_key(field, prefix)
+        if not prefix:
+            return []
+        candidates = self.secondary_index(field).find_prefix(prefix, limit)
+        return self.verify_candidates(candidates, field, lambda found: found.startswith(prefix))
+
+    def verify_candidates(self, emails, field, matches):
+        """Drop index entries the current record no longer agrees with"""
+        verified = []
+        for email in emails:
+            record = self.get(email)
+            if record is not None and matches(lookup_key(field, record.get(field))):
+                verified.append(email)
+        return verified
+
+
+class ConflictError(Exception):
+    """A new record collided with one stored by another writer"""
+
+
+class SecondaryIndex:
+    """In-memory index from one field's lookup keys to emails
+
+    A dict answers exact lookups and a sorted key list answers prefix
+    searches with bisect. Keys added in bulk are sorted once, on the next
+    prefix search. Backends that cannot tell which value a record had
+    before an update leave the old entry behind, so results are checked
+    against the current records by IndexedUserStorage.find.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        # lookup key -> emails; older databases may hold duplicates
+        self.emails = {}
+        self.keys = []
+        # Keys added since the sorted list was last brought up to date
+        self.unsorted = []
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Forget every entry"""
+        with self.lock:
+            self.emails = {}
+            self.keys = []
+            self.unsorted = []
+
+    def add(self, email, record):
+        """Index record under email"""
+        key = lookup_key(self.field, record.get(self.field))
+        if not key:
+            return
+        with self.lock:
+            emails = self.emails.get(key)
+            if emails is None:
+                self.emails[key] = {email}
+                self.unsorted.append(key)
+            else:
+                emails.add(email)
+
+    def remove(self, email, record):
+        """Remove the entry record had under email"""
+        key = lookup_key(self.field, record.get(self.field))
+        with self.lock:
+            emails = self.emails.get(key)
+            if emails is None:
+                return
+            emails.discard(email)
+            if not emails:
+                del self.emails[key]
+                self.sort_keys()
+                position = bisect_left(self.keys, key)
+                if position < len(self.keys) and self.keys[position] == key:
+                    del self.keys[position]
+
+    def update(self, email, old_record, new_record):
+        """Move email from old_record's value to new_record's"""
+        if old_record is not None:
+            if lookup_key(self.field, old_record.get(self.field)) == \
+                    lookup_key(self.field, new_record.get(self.field)):
+                return
+            self.remove(email, old_record)
+        self.add(email, new_record)
+
+    def sort_keys(self):
+        """Merge keys added since the last search into the sorted list
+
+        Called with the lock held.
+        """
+        if not self.unsorted:
+            return
+        if len(self.unsorted) < 32:
+            for key in self.unsorted:
+                insort(self.keys, key)
+        else:
+            self.keys.extend(self.unsorted)
+            self.keys.sort()
+        self.unsorted = []
+
+    def find(self, key):
+        """Return the emails indexed under a lookup key"""
+        with self.lock:
+            return sorted(self.emails.get(key, ()))
+
+    def find_prefix(self, prefix, limit):
+        """Return up to limit emails whose lookup key starts with prefix"""
+        found = []
+        with self.lock:
+            self.sort_keys()
+            position = bisect_left(self.keys, prefix)
+            while position < len(self.keys) and len(found) < limit:
+                key = self.keys[position]
+                if not key.startswith(prefix):
+                    break
+                found.extend(sorted(self.emails[key]))
+                position += 1
+        return found[:limit]
+
+
+def file_signature(path):
+    """Return a cheap change marker for a file, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class FileLock:
+    """Advisory lock shared between threads and processes
+
+    Re-entrant within a thread; other processes block on a sidecar lock
+    file until the holder releases it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.handle = None
+
+    def acquire(self, blocking=True):
+        """Take the lock, returning False if blocking is off and it is held"""
+        if not self.thread_lock.acquire(blocking):
+            return False
+        if self.depth == 0:
+            handle = open(self.path, 'a+b')
+            if not self.lock_file(handle, blocking):
+                handle.close()
+                self.thread_lock.release()
+                return False
+            self.handle = handle
+        self.depth += 1
+        return True
+
+    def lock_file(self, handle, blocking):
+        """Lock the first byte of the lock file"""
+        if os.name == 'nt':
+            mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+            while True:
+                try:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), mode, 1)
+                    return True
+                except OSError:
+                    # LK_LOCK gives up after ten seconds; keep waiting
+                    if not blocking:
+                        return False
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+
+    def release(self):
+        """Release one level of the lock"""
+        self.depth -= 1
+        if self.depth == 0:
+            if os.name == 'nt':
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+            self.handle.close()
+            self.handle = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class JsonFileStorage(IndexedUserStorage):
+    """JSON snapshot plus an append-only journal of mutations
+
+    Several processes may share the files. Writers append under a file
+    lock after catching up with everyone else's appends, and each journal
+    starts with a header carrying a generation number that changes
+    whenever a compaction rotates it. Readers compare file signatures to
+    notice changes and replay only the journal bytes they have not seen.
+    """
+
+    # Journal records accumulated before a background compaction is started
+    COMPACT_THRESHOLD = 1000
+
+    def __init__(self, db_file, snapshot=None):
+        self.db_file = db_file
+        # (signature, users) parsed ahead of time, e.g. by a sharded parent
+        self.preloaded = snapshot
+        self.journal_file = self.db_file + ".journal"
+        self.old_journal_file = self.journal_file + ".old"
+        self.lock = FileLock(self.db_file + ".lock")
+        # Held by whichever process is compacting
+        self.compaction_lock = FileLock(self.db_file + ".compact.lock")
+        self.compaction_thread = None
+        self.last_generation = 0
+        self.indexes = {field: SecondaryIndex(field) for field in INDEXED_FIELDS}
+        self.load()
+
+    def load(self):
+        """Load database snapshot and replay the journal on top of it"""
+        with self.lock:
+            self.snapshot_signature = file_signature(self.db_file)
+            preloaded, self.preloaded = self.preloaded, None
+            if preloaded is not None and preloaded[0] == self.snapshot_signature:
+                self.users, version, quarantined = preloaded[1]
+            else:
+                self.users, version, quarantined = self.read_snapshot()
+            for email, record in self.users.items():
+                self.users[email] = compact_record(email, record)
+            if quarantined or version not in (None, SCHEMA_VERSION):
+                self.repair_snapshot(quarantined)
+            for index in self.indexes.values():
+                index.clear()
+                for email, record in self.users.items():
+                    index.add(email, record)
+            self.journal_generation = None
+            self.journal_signature = None
+            self.journal_offset = 0
+            self.journal_records = 0
+
+            # A compaction in progress, or interrupted by a crash, leaves its
+            # rotated journal behind; replayed records stay in the journal
+            # until the next compaction
+            old_generation = self.header_generation(self.old_journal_file)
+            if old_generation is not None:
+                self.last_generation = max(self.last_generation, old_generation)
+                self.replay_journal(self.old_journal_file, 0)
+            self.read_journal()
+
+    def read_snapshot(self):
+        """Stream the snapshot file, returning (users, version, quarantined)"""
+        try:
+            return read_snapshot_file(self.db_file)
+        except UnreadableSnapshotError:
+            # Keep whatever it is for inspection instead of overwriting it
+            os.replace(self.db_file, "%s.corrupt-%d" % (self.db_file, time.time()))
+            self.snapshot_signature = None
+            return {}, None, []
+
+    def repair_snapshot(self, quarantined):
+        """Rewrite the snapshot in the current layout without bad records
+
+        Called with the file lock held, before the journal is replayed, so
+        the users in memory are exactly the readable part of the snapshot.
+        """
+        quarantine_records(self.db_file, quarantined)
+        os.replace(self.write_snapshot_file(self.users), self.db_file)
+        self.snapshot_signature = file_signature(self.db_file)
+
+    def refresh(self):
+        """Merge changes other processes made since the last look"""
+        if (file_signature(self.db_file) == self.snapshot_signature
+                and file_signature(self.journal_file) == self.journal_signature):
+            return
+        with self.lock:
+            self.refresh_locked()
+
+    def refresh_locked(self):
+        """Catch up with other writers while holding the file lock"""
+        if file_signature(self.db_file) != self.snapshot_signature:
+            # Someone else compacted; the snapshot now holds their state
+            self.load()
+        elif file_signature(self.journal_file) != self.journal_signature:
+            self.read_journal()
+
+    def header_generation(self, path):
+        """Return a journal's generation, or None if it is missing or torn"""
+        try:
+            with open(path, 'rb') as f:
+                header = self.decode_journal_record(f.readline())
+        except FileNotFoundError:
+            return None
+        if not header or header.get('op') != 'header':
+            return None
+        return header['generation']
+
+    def read_journal(self):
+        """Apply journal records this process has not seen yet"""
+        generation = self.header_generation(self.journal_file)
+        if generation != self.journal_generation:
+            # The journal we were following was rotated by a compaction
+            # that is still running; finish reading it first
+            if (self.journal_generation is not None
+                    and self.header_generation(self.old_journal_file) == self.journal_generation):
+                self.replay_journal(self.old_journal_file, self.journal_offset)
+            self.journal_generation = generation
+            self.journal_offset = 0
+            self.journal_records = 0
+        if generation is not None:
+            self.last_generation = max(self.last_generation, generation)
+            self.journal_offset, replayed = self.replay_journal(self.journal_file, self.journal_offset)
+            self.journal_records += replayed
+        self.journal_signature = file_signature(self.journal_file)
+
+    def replay_journal(self, path, offset):
+        """Apply intact journal records from offset, truncating a torn tail"""
+        replayed = 0
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            for line in f:
+                record = self.decode_journal_record(line)
+                if record is None:
+                    break
+                self.apply_record(record)
+                offset += len(line)
+                replayed += 1
+            drop_torn_tail(f, path, offset)
+        return offset, replayed
+
+    def encode_journal_record(self, record):
+        """Serialize one journal record as a checksummed line"""
+        payload = json.dumps(record, separators=(',', ':')).encode()
+        return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+    def decode_journal_record(self, line):
+        """Parse one journal line, returning None if it is torn or corrupt"""
+        if not line.endswith(b"\n"):
+            return None
+        checksum, _, payload = line.rstrip(b"\n").partition(b" ")
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def apply_record(self, record):
+        """Apply a single journal record to the in-memory users"""
+        if record.get('op') == 'put':
+            self.store_user(record['email'], record['user'])
+
+    def store_user(self, email, record):
+        """Replace a user in memory, keeping the secondary indexes in step"""
+        old_record = self.users.get(email)
+        record = compact_record(email, record)
+        self.users[email] = record
+        for index in self.indexes.values():
+            index.update(email, old_record, record)
+
+    def append_journal(self, records):
+        """Durably append mutation records to the journal
+
+        The caller holds the file lock and has caught up with the journal.
+        """
+        data = b"".join(self.encode_journal_record(record) for record in records)
+        if self.journal_generation is None:
+            # Start a new journal; a torn header from a crash is overwritten
+            self.last_generation += 1
+            self.journal_generation = self.last_generation
+            header = self.encode_journal_record({'op': 'header', 'generation': self.journal_generation})
+            mode = 'wb'
+        else:
+            header = b""
+            mode = 'ab'
+        with open(self.journal_file, mode) as f:
+            f.write(header + data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_offset = os.path.getsize(self.journal_file)
+        self.journal_signature = file_signature(self.journal_file)
+        self.journal_records += len(records)
+        if self.journal_records >= self.COMPACT_THRESHOLD:
+            self.start_compaction()
+
+    def start_compaction(self):
+        """Fold the journal into a snapshot in the background"""
+        if self.compaction_thread and self.compaction_thread.is_alive():
+            return
+        self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self.compaction_thread.start()
+
+    def compact(self):
+        """Rotate the journal, write a snapshot, then drop the rotated journal"""
+        # Only one process compacts at a time; the others keep appending
+        if not self.compaction_lock.acquire(blocking=False):
+            return
+        try:
+            with self.lock:
+                self.refresh_locked()
+                if self.journal_generation is None:
+                    return
+                if os.path.exists(self.old_journal_file):
+                    # Left by a crashed compaction; keep its records in front
+                    with open(self.old_journal_file, 'ab') as dst, open(self.journal_file, 'rb') as src:
+                        src.readline()
+                        shutil.copyfileobj(src, dst)
+                    os.remove(self.journal_file)
+                else:
+                    os.replace(self.journal_file, self.old_journal_file)
+                self.journal_generation = None
+                self.journal_signature = None
+                self.journal_offset = 0
+                self.journal_records = 0
+                snapshot = dict(self.users)
+
+            tmp_file = self.write_snapshot_file(snapshot)
+
+            with self.lock:
+                os.replace(tmp_file, self.db_file)
+                os.remove(self.old_journal_file)
+                # The new snapshot is what this process already holds
+                self.snapshot_signature = file_signature(self.db_file)
+        finally:
+            self.compaction_lock.release()
+
+    def write_snapshot_file(self, users):
+        """Write users to a temporary snapshot file and return its path"""
+        return write_snapshot_file(self.db_file, users)
+
+    def close(self):
+        """Wait for a running compaction to finish"""
+        if self.compaction_thread:
+            self.compaction_thread.join()
+            self.compaction_thread = None
+
+    def get(self, email):
+        """Return the stored user record or None"""
+        return self.users.get(email)
+
+    def contains(self, email):
+        """Check if a user record is stored"""
+        return email in self.users
+
+    def put_many(self, records, new_only=False):
+        """Store records in memory and journal them in one append"""
+        with self.lock:
+            self.refresh_locked()
+            records, conflicts = self.split_conflicts(records, new_only)
+            for record in records:
+                self.store_user(record['email'], record)
+            if records:
+                self.append_journal([
+                    {'op': 'put', 'email': record['email'], 'user': record}
+                    for record in records
+                ])
+        return conflicts
+
+    def secondary_index(self, field):
+        """Return the SecondaryIndex kept for one of INDEXED_FIELDS"""
+        return self.indexes[field]
+
+    def iter_records(self):
+        """Yield every stored user record as a dict"""
+        return (dict(record) for record in list(self.users.values()))
+
+    def count(self):
+        """Return the number of stored users"""
+        return len(self.users)
+
+
+class SqliteStorage(UserStorage):
+    """SQLite database in WAL mode, keyed by email"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            email TEXT PRIMARY KEY,
+            full_name TEXT,
+            username TEXT,
+            phone TEXT,
+            country TEXT,
+            password TEXT NOT NULL,
+            username_key TEXT,
+            phone_key TEXT
+        ) WITHOUT ROWID
+    """
+    # Normalized lookup_key columns back the username and phone searches
+    KEY_COLUMNS = tuple(field + "_key" for field in INDEXED_FIELDS)
+    INDEXES = [
+        "CREATE INDEX IF NOT EXISTS users_%s ON users (%s)" % (column, column)
+        for column in KEY_COLUMNS
+    ]
+
+    # Statements are kept as constants so sqlite3's statement cache
+    # compiles each of them once per connection and reuses it afterwards
+    SELECT_USER = "SELECT %s FROM users WHERE email = ?" % ", ".join(USER_FIELDS)
+    SELECT_PASSWORD = "SELECT password FROM users WHERE email = ?"
+    SELECT_EXISTS = "SELECT 1 FROM users WHERE email = ?"
+    SELECT_ALL = "SELECT %s FROM users" % ", ".join(USER_FIELDS)
+    SELECT_COUNT = "SELECT COUNT(*) FROM users"
+    SELECT_BY_KEY = {
+        field: "SELECT email FROM users WHERE %s_key = ? ORDER BY email" % field
+        for field in INDEXED_FIELDS
+    }
+    SELECT_BY_PREFIX = {
+        field: "SELECT email FROM users WHERE %s_key >= ? AND %s_key < ? "
+               "ORDER BY %s_key, email LIMIT ?" % (field, field, field)
+        for field in INDEXED_FIELDS
+    }
+    SELECT_UNKEYED = "SELECT email, username, phone FROM users WHERE username_key IS NULL"
+    UPDATE_KEYS = "UPDATE users SET username_key = ?, phone_key = ? WHERE email = ?"
+    UPSERT_USER = "INSERT OR REPLACE INTO users (%s) VALUES (%s)" % (
+        ", ".join(USER_FIELDS + KEY_COLUMNS), ", ".join("?" * (len(USER_FIELDS) + len(KEY_COLUMNS)))
+    )
+    INSERT_USER = "INSERT INTO users (%s) VALUES (%s)" % (
+        ", ".join(USER_FIELDS + KEY_COLUMNS), ", ".join("?" * (len(USER_FIELDS) + len(KEY_COLUMNS)))
+    )
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL would survive app crashes but can lose the last commits on
+        # power loss; FULL syncs the WAL on every commit, like the JSON journal
+        self.conn.execute("PRAGMA synchronous=FULL")
+        with self.conn:
+            self.conn.execute(self.SCHEMA)
+            self.add_key_columns()
+            for statement in self.INDEXES:
+                self.conn.execute(statement)
+
+    def add_key_columns(self):
+        """Add and fill the lookup key columns in databases made before them"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(users)")}
+        for column in self.KEY_COLUMNS:
+            if column not in columns:
+                self.conn.execute("ALTER TABLE users ADD COLUMN %s TEXT" % column)
+        # Rows written by older versions have no keys yet
+        rows = self.conn.execute(self.SELECT_UNKEYED).fetchall()
+        self.conn.executemany(self.UPDATE_KEYS, [
+            (lookup_key('username', username), lookup_key('phone', phone), email)
+            for email, username, phone in rows
+        ])
+
+    def row_to_record(self, row):
+        """Convert a users row into a user record"""
+        return dict(zip(USER_FIELDS, row))
+
+    def get(self, email):
+        """Return the stored user record or None"""
+        with self.lock:
+            row = self.conn.execute(self.SELECT_USER, (email,)).fetchone()
+        return self.row_to_record(row) if row else None
+
+    def contains(self, email):
+        """Check if a user record is stored"""
+        with self.lock:
+            return self.conn.execute(self.SELECT_EXISTS, (email,)).fetchone() is not None
+
+    def get_password(self, email):
+        """Return the stored password hash or None"""
+        with self.lock:
+            row = self.conn.execute(self.SELECT_PASSWORD, (email,)).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, records, new_only=False):
+        """Store records in a single transaction"""
+        rows = [
+            tuple(record.get(field) for field in USER_FIELDS)
+            + tuple(lookup_key(field, record.get(field)) for field in INDEXED_FIELDS)
+            for record in records
+        ]
+        conflicts = []
+        with self.lock, self.conn:
+            if not new_only:
+                self.conn.executemany(self.UPSERT_USER, rows)
+            else:
+                # The primary key rejects emails other processes stored first
+                for record, row in zip(records, rows):
+                    try:
+                        self.conn.execute(self.INSERT_USER, row)
+                    except sqlite3.IntegrityError:
+                        conflicts.append(record['email'])
+        return conflicts
+
+    def iter_records(self, batch_size=1000):
+        """Stream every stored user record in batches"""
+        with self.lock:
+            cursor = self.conn.execute(self.SELECT_ALL)
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                yield self.row_to_record(row)
+            with self.lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def count(self):
+        """Return the number of stored users"""
+        with self.lock:
+            return self.conn.execute(self.SELECT_COUNT).fetchone()[0]
+
+    def find(self, field, value):
+        """Return the emails of users whose field matches value"""
+        key = lookup_key(field, value)
+        if not key:
+            return []
+        with self.lock:
+            return [row[0] for row in self.conn.execute(self.SELECT_BY_KEY[field], (key,))]
+
+    def find_prefix(self, field, prefix, limit=20):
+        """Return up to limit emails whose field starts with prefix, in value order"""
+        prefix = lookup_key(field, prefix)
+        if not prefix:
+            return []
+        # A range scan uses the index where LIKE would not
+        with self.lock:
+            rows = self.conn.execute(
+                self.SELECT_BY_PREFIX[field], (prefix, prefix + "\U0010ffff", limit)
+            )
+            return [row[0] for row in rows]
+
+    def close(self):
+        """Close the database connection"""
+        with self.lock:
+            self.conn.close()
+
+
+class IndexedFileStorage(IndexedUserStorage):
+    """Append-only record log with a memory-mapped email index
+
+    Only the index header is read at startup. Records are fetched from the
+    log on demand, and records appended after the index was last written
+    are kept in a small in-memory tail until the index is rebuilt. The
+    username and phone indexes are filled by a background scan of the log
+    started at load, so neither the UI nor writers wait on it.
+    """
+
+    INDEX_MAGIC = b"MRUIDX01"
+    # magic, entry count, log offset covered by the index
+    INDEX_HEADER = struct.Struct('<8sQQ')
+    # email hash, log offset
+    INDEX_ENTRY = struct.Struct('<QQ')
+    # Tail records accumulated before the index is rebuilt in the background
+    REINDEX_THRESHOLD = 5000
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.index_file = db_file + ".idx"
+        self.lock = threading.RLock()
+        # Serializes appends and index swaps with other processes
+        self.file_lock = FileLock(db_file + ".lock")
+        self.index_thread = None
+        self.index_handle = None
+        self.index_map = None
+        # Secondary indexes, set once the scan started at load has finished
+        self.indexes = None
+        # The indexes being filled by that scan, which appends also go into
+        self.building_indexes = None
+        self.indexes_ready = threading.Event()
+        self.closing = False
+        self.load()
+        self.secondary_thread = threading.Thread(target=self.build_secondary_indexes, daemon=True)
+        self.secondary_thread.start()
+
+    def load(self):
+        """Map the index and scan only the records appended after it"""
+        self.open_index()
+        # email -> log offset for records not yet covered by the index
+        self.tail = {}
+        self.tail_new = 0
+        self.writer = open(self.db_file, 'ab')
+        self.reader = open(self.db_file, 'rb')
+        self.scanned_end = self.index_end
+        with self.file_lock, self.lock:
+            self.scan_tail()
+        if len(self.tail) >= self.REINDEX_THRESHOLD:
+            self.start_reindex()
+
+    def open_index(self):
+        """Memory-map the index file if there is a valid one"""
+        self.index_count = 0
+        self.index_end = 0
+        self.index_signature = file_signature(self.index_file)
+        if self.index_signature is None:
+            return
+        self.index_handle = open(self.index_file, 'rb')
+        try:
+            self.index_map = mmap.mmap(self.index_handle.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, count, data_end = self.INDEX_HEADER.unpack_from(self.index_map, 0)
+        except (ValueError, struct.error):
+            magic = None
+        if magic != self.INDEX_MAGIC:
+            # Unreadable index: fall back to scanning the whole log
+            self.close_index()
+            return
+        self.index_count = count
+        self.index_end = data_end
+
+    def close_index(self):
+        """Unmap and close the index file"""
+        if self.index_map is not None:
+            self.index_map.close()
+            self.index_map = None
+        if self.index_handle is not None:
+            self.index_handle.close()
+            self.index_handle = None
+        self.index_count = 0
+
+    def scan_tail(self):
+        """Add log records not seen yet to the tail, truncating a torn end"""
+        offset = self.scanned_end
+        self.reader.seek(offset)
+        for line in self.reader:
+            record = self.decode_line(line)
+            if record is None:
+                break
+            self.add_to_tail(record['email'], offset)
+            self.index_user(record)
+            offset += len(line)
+        self.scanned_end = offset
+        drop_torn_tail(self.writer, self.db_file, offset)
+
+    def refresh(self):
+        """Pick up records and indexes written by other processes"""
+        if (os.path.getsize(self.db_file) == self.scanned_end
+                and file_signature(self.index_file) == self.index_signature):
+            return
+        with self.file_lock, self.lock:
+            self.refresh_locked()
+
+    def refresh_locked(self):
+        """Catch up with other writers while holding the file lock"""
+        reindexing = self.index_thread and self.index_thread.is_alive()
+        if not reindexing and file_signature(self.index_file) != self.index_signature:
+            # Another process rebuilt the index; tail entries stay valid
+            self.close_index()
+            self.open_index()
+            self.tail_new = sum(1 for email in self.tail if self.index_lookup(email) is None)
+        self.scan_tail()
+
+    def decode_line(self, line):
+        """Parse one log line, returning None if it is torn or corrupt"""
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def add_to_tail(self, email, offset):
+        """Point email at a freshly appended record"""
+        if email not in self.tail and self.index_lookup(email) is None:
+            self.tail_new += 1
+        self.tail[email] = offset
+
+    def email_hash(self, email):
+        """Return the 64-bit index key of an email"""
+        return int.from_bytes(blake2b(email.encode(), digest_size=8).digest(), 'little')
+
+    def index_key(self, position):
+        """Return the email hash stored at an index position"""
+        return self.INDEX_ENTRY.unpack_from(
+            self.index_map, self.INDEX_HEADER.size + position * self.INDEX_ENTRY.size
+        )
+
+    def index_lookup(self, email):
+        """Binary search the mapped index for an email's log offset"""
+        if not self.index_count:
+            return None
+        key = self.email_hash(email)
+        low, high = 0, self.index_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.index_key(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        # Distinct emails may share a hash; check each candidate
+        while low < self.index_count:
+            entry_key, offset = self.index_key(low)
+            if entry_key != key:
+                break
+            if self.read_record(offset)['email'] == email:
+                return offset
+            low += 1
+        return None
+
+    def offset_of(self, email):
+        """Return the log offset of the current record for email"""
+        with self.lock:
+            offset = self.tail.get(email)
+            if offset is None:
+                offset = self.index_lookup(email)
+            return offset
+
+    def read_record(self, offset):
+        """Read the record stored at a log offset"""
+        with self.lock:
+            self.reader.seek(offset)
+            return json.loads(self.reader.readline())
+
+    def get(self, email):
+        """Return the stored user record or None"""
+        with self.lock:
+            offset = self.offset_of(email)
+            return self.read_record(offset) if offset is not None else None
+
+    def contains(self, email):
+        """Check if a user record is stored"""
+        return self.offset_of(email) is not None
+
+    def put_many(self, records, new_only=False):
+        """Append records to the log with a single write"""
+        with self.file_lock, self.lock:
+            self.refresh_locked()
+            records, conflicts = self.split_conflicts(records, new_only)
+            lines = [json.dumps(record, separators=(',', ':')).encode() + b"\n" for record in records]
+            offset = self.writer.seek(0, os.SEEK_END)
+            self.writer.write(b"".join(lines))
+            self.writer.flush()
+            os.fsync(self.writer.fileno())
+            for record, line in zip(records, lines):
+                self.add_to_tail(record['email'], offset)
+                self.index_user(record)
+                offset += len(line)
+            self.scanned_end = offset
+            if len(self.tail) >= self.REINDEX_THRESHOLD:
+                self.start_reindex()
+        return conflicts
+
+    def iter_records(self):
+        """Stream the current version of every record from the log"""
+        with open(self.db_file, 'rb') as f:
+            offset = 0
+            for line in f:
+                record = self.decode_line(line)
+                if record is None:
+                    break
+                # Skip versions superseded by a later append
+                if self.offset_of(record['email']) == offset:
+                    yield record
+                offset += len(line)
+
+    def count(self):
+        """Return the number of stored users"""
+        with self.lock:
+            return self.index_count + self.tail_new
+
+    def index_user(self, record):
+        """Add an appended record to the secondary indexes, built or building
+
+        The previous version is not read back, so its entry stays behind
+        until IndexedUserStorage.find filters it out.
+        """
+        for indexes in (self.indexes, self.building_indexes):
+            if indexes is not None:
+                for index in indexes.values():
+                    index.add(record['email'], record)
+
+    def build_secondary_indexes(self):
+        """Scan the log into the secondary indexes; runs on its own thread
+
+        The lock is only taken per record, so appends and lookups by email
+        go on meanwhile. A record updated during the scan may leave its old
+        entry behind, which find filters out like any other stale entry.
+        """
+        indexes = {name: SecondaryIndex(name) for name in INDEXED_FIELDS}
+        with self.lock:
+            self.building_indexes = indexes
+        try:
+            for record in self.iter_records():
+                if self.closing:
+                    return
+                for index in indexes.values():
+                    index.add(record['email'], record)
+            with self.lock:
+                self.indexes = indexes
+        finally:
+            with self.lock:
+                self.building_indexes = None
+            self.indexes_ready.set()
+
+    def secondary_index(self, field):
+        """Return a secondary index, waiting for the scan started at load"""
+        self.indexes_ready.wait()
+        with self.lock:
+            if self.indexes is None:
+                # The background scan failed; scan here instead
+                indexes = {name: SecondaryIndex(name) for name in INDEXED_FIELDS}
+                for record in self.iter_records():
+                    for index in indexes.values():
+                        index.add(record['email'], record)
+                self.indexes = indexes
+            return self.indexes[field]
+
+    def start_reindex(self):
+        """Merge the tail into a new index file in the background"""
+        with self.lock:
+            if self.index_thread and self.index_thread.is_alive():
+                return
+            self.index_thread = threading.Thread(target=self.reindex, daemon=True)
+            self.index_thread.start()
+
+    def reindex(self):
+        """Write a new index covering the whole log and swap it in"""
+        with self.lock:
+            tail = dict(self.tail)
+            data_end = self.scanned_end
+        tail_entries = sorted((self.email_hash(email), offset) for email, offset in tail.items())
+        tail_keys = {key for key, _ in tail_entries}
+
+        def old_entries():
+            for position in range(self.index_count):
+                key, offset = self.index_key(position)
+                # Drop entries whose email was rewritten in the tail
+                if key in tail_keys and self.read_record(offset)['email'] in tail:
+                    continue
+                yield key, offset
+
+        tmp_file = create_temp_file(self.index_file)
+        count = 0
+        with open(tmp_file, 'wb') as f:
+            f.write(self.INDEX_HEADER.pack(self.INDEX_MAGIC, 0, 0))
+            for entry in heapq.merge(old_entries(), tail_entries):
+                f.write(self.INDEX_ENTRY.pack(*entry))
+                count += 1
+            # The header is written last so a torn index is never trusted
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(self.INDEX_HEADER.pack(self.INDEX_MAGIC, count, data_end))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self.file_lock, self.lock:
+            if file_signature(self.index_file) != self.index_signature:
+                # Another process swapped in a newer index meanwhile; keep it
+                os.remove(tmp_file)
+                return
+            # Windows cannot replace a file that is still mapped
+            self.close_index()
+            try:
+                os.replace(tmp_file, self.index_file)
+            except PermissionError:
+                # Another process still maps the old index; it stays valid
+                os.remove(tmp_file)
+                self.open_index()
+                return
+            self.open_index()
+            for email, offset in tail.items():
+                if self.tail.get(email) == offset:
+                    del self.tail[email]
+            self.tail_new = sum(1 for email in self.tail if self.index_lookup(email) is None)
+
+    def close(self):
+        """Bring the index up to date and close all files"""
+        self.closing = True
+        self.secondary_thread.join()
+        if self.index_thread:
+            self.index_thread.join()
+            self.index_thread = None
+        if self.tail:
+            self.reindex()
+        with self.lock:
+            self.close_index()
+            self.reader.close()
+            self.writer.close()
+
+
+def shard_of(email, shard_count):
+    """Return the shard an email is stored in"""
+    digest = blake2b(email.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % shard_count
+
+
+def read_manifest(db_dir):
+    """Return the manifest of a sharded database, or None for a new one"""
+    try:
+        with open(os.path.join(db_dir, "manifest.json"), 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') != ShardedStorage.MANIFEST_VERSION:
+        raise ValueError(f"{db_dir} has an unsupported shard layout")
+    return manifest
+
+
+def shard_files(db_dir, shard_count):
+    """Return the snapshot paths of a sharded layout"""
+    return [os.path.join(db_dir, "shard-%03d-of-%03d.json" % (index, shard_count))
+            for index in range(shard_count)]
+
+
+def parse_shard(path):
+    """Read one shard snapshot; runs in a process pool worker"""
+    # Taken first, so a snapshot replaced meanwhile is read again
+    signature = file_signature(path)
+    try:
+        # Plain dicts pickle back faster than UserRecords
+        return signature, read_snapshot_file(path, compact=False)
+    except UnreadableSnapshotError:
+        # Left for the shard to deal with under its lock
+        return None
+
+
+class ShardedStorage(UserStorage):
+    """Users spread over JSON shard files by a hash of their email
+
+    The database is a directory holding a manifest and one JsonFileStorage
+    per shard, each with its own journal, file lock and compaction. A
+    write only appends to the journals of the shards it touches and a
+    compaction only rewrites one shard, so neither grows with the total
+    user count. In a frozen build, large databases are parsed by a process
+    pool, one shard per task, while this process indexes the shards
+    already returned.
+
+    Records written together but hashed to different shards are journaled
+    shard by shard, so a crash in between can keep only some of them.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, db_dir, shard_count=DEFAULT_SHARD_COUNT):
+        self.db_dir = db_dir
+        self.manifest_file = os.path.join(db_dir, "manifest.json")
+        os.makedirs(db_dir, exist_ok=True)
+        manifest = read_manifest(db_dir)
+        if manifest is None:
+            manifest = {'version': self.MANIFEST_VERSION, 'shards': shard_count}
+            self.write_manifest(manifest)
+        self.shard_count = manifest['shards']
+        self.shards = self.open_shards(self.shard_count)
+
+    def write_manifest(self, manifest):
+        """Replace the manifest atomically"""
+        write_atomic(self.manifest_file, json.dumps(manifest))
+
+    def shard_files(self, shard_count):
+        """Return the snapshot paths of a layout with shard_count shards"""
+        return shard_files(self.db_dir, shard_count)
+
+    def open_shards(self, shard_count):
+        """Open every shard, parsing large databases in parallel when frozen
+
+        A spawned worker imports the main script again as __mp_main__, which
+        for the app would load Kivy and open a window in every worker. Only
+        a frozen build, where freeze_support() sends workers off before that,
+        uses the pool; otherwise shards are parsed in this process.
+        """
+        paths = self.shard_files(shard_count)
+        if not getattr(sys, 'frozen', False):
+            return [JsonFileStorage(path) for path in paths]
+        size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+        workers = min(shard_count, os.cpu_count() or 1)
+        if size < PARALLEL_LOAD_BYTES or workers < 2:
+            return [JsonFileStorage(path) for path in paths]
+        # Only large databases need the pool; keep it off small startups
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return [JsonFileStorage(path, snapshot)
+                    for path, snapshot in zip(paths, pool.map(parse_shard, paths))]
+
+    def shard(self, email):
+        """Return the shard storage holding email"""
+        return self.shards[shard_of(email, self.shard_count)]
+
+    def refresh(self):
+        """Merge changes other processes made to any shard"""
+        for shard in self.shards:
+            shard.refresh()
+
+    def get(self, email):
+        """Return the stored user record or None"""
+        return self.shard(email).get(email)
+
+    def contains(self, email):
+        """Check if a user record is stored"""
+        return self.shard(email).contains(email)
+
+    def put_many(self, records, new_only=False):
+        """Group records by shard and journal each group in one append"""
+        groups = {}
+        for record in records:
+            groups.setdefault(shard_of(record['email'], self.shard_count), []).append(record)
+        conflicts = []
+        for index, group in groups.items():
+            conflicts += self.shards[index].put_many(group, new_only)
+        return conflicts
+
+    def find(self, field, value):
+        """Return the emails of users whose field matches value"""
+        emails = []
+        for shard in self.shards:
+            emails += shard.find(field, value)
+        return emails
+
+    def find_prefix(self, field, prefix, limit=20):
+        """Return up to limit emails whose field starts with prefix, in value order"""
+        matches = []
+        for shard in self.shards:
+            for email in shard.find_prefix(field, prefix, limit):
+                record = shard.get(email)
+                if record is not None:
+                    matches.append((lookup_key(field, record.get(field)), email))
+        return [email for _, email in heapq.nsmallest(limit, matches)]
+
+    def iter_records(self):
+        """Yield every stored user record"""
+        for shard in self.shards:
+            yield from shard.iter_records()
+
+    def count(self):
+        """Return the number of stored users"""
+        return sum(shard.count() for shard in self.shards)
+
+    def reshard(self, shard_count):
+        """Move every user into a layout with shard_count shards
+
+        Only run it while no other process has the database open. The new
+        shard files are written beside the old ones and the manifest is
+        switched last, so an interrupted reshard leaves the old layout.
+        """
+        if shard_count == self.shard_count:
+            return
+        self.refresh()
+        self.close()
+        buckets = [{} for _ in range(shard_count)]
+        for shard in self.shards:
+            for email, record in shard.users.items():
+                buckets[shard_of(email, shard_count)][email] = record
+
+        paths = self.shard_files(shard_count)
+        for path, users in zip(paths, buckets):
+            os.replace(write_snapshot_file(path, users), path)
+            # Journals left by an earlier layout with this shard count
+            for leftover in (path + ".journal", path + ".journal.old"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        self.write_manifest({'version': self.MANIFEST_VERSION, 'shards': shard_count})
+
+        for shard in self.shards:
+            for path in (shard.db_file, shard.journal_file, shard.old_journal_file,
+                         shard.lock.path, shard.compaction_lock.path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.shard_count = shard_count
+        self.shards = [JsonFileStorage(path, (file_signature(path), (users, SCHEMA_VERSION, [])))
+                       for path, users in zip(paths, buckets)]
+
+    def close(self):
+        """Wait for running shard compactions to finish"""
+        for shard in self.shards:
+            shard.close()
+
+
+def open_storage(db_file):
+    """Open the storage backend matching the database file extension"""
+    extension = os.path.splitext(db_file)[1].lower()
+    if extension in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteStorage(db_file)
+    if extension == '.udb':
+        return IndexedFileStorage(db_file)
+    if extension == '.shards':
+        return ShardedStorage(db_file)
+    return JsonFileStorage(db_file)
@@ -0,0 +1,148 @@
+from collections import deque
+import random
+import threading
+import time
+
+
+class TickBuffer:
+    """Bounded ring buffer of (symbol, price, time) ticks
+
+    One producer thread pushes and the UI thread drains once per frame.
+    deque appends and pops are atomic, so neither side takes a lock; when
+    the buffer is full the oldest ticks are overwritten and counted as
+    dropped, since only the newest prices matter to the display.
+    """
+
+    def __init__(self, capacity=8192, high_water=0.75):
+        self.capacity = capacity
+        self.ticks = deque(maxlen=capacity)
+        # Fill level at which producers are asked to slow down
+        self.high_water = int(capacity * high_water)
+        # Each counter is only written by one side
+        self.pushed = 0
+        self.drained = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.peak_fill = 0
+
+    def push(self, symbol, price, timestamp=None):
+        """Add a tick; returns False once the producer should back off"""
+        self.ticks.append((symbol, price, time.time() if timestamp is None else timestamp))
+        self.pushed += 1
+        fill = len(self.ticks)
+        if fill > self.peak_fill:
+            self.peak_fill = fill
+        return fill < self.high_water
+
+    def drain_latest(self):
+        """Take every buffered tick, returning the newest one per symbol"""
+        latest = {}
+        ticks = self.ticks
+        taken = 0
+        # Only what is buffered now; the producer may keep appending
+        for _ in range(len(ticks)):
+            try:
+                tick = ticks.popleft()
+            except IndexError:
+                break
+            latest[tick[0]] = tick
+            taken += 1
+        self.drained += taken
+        self.coalesced += taken - len(latest)
+        return latest
+
+    def dropped(self):
+        """Return how many ticks were overwritten before being drained"""
+        return max(0, self.pushed - self.drained - len(self.ticks))
+
+    def stats(self):
+        """Return the pipeline counters as a dict"""
+        return {
+            'pushed': self.pushed,
+            'drained': self.drained,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped(),
+            'throttled': self.throttled,
+            'buffered': len(self.ticks),
+            'peak_fill': self.peak_fill,
+            'capacity': self.capacity,
+        }
+
+
+class SimulatedFeed(threading.Thread):
+    """Local random-walk price feed for trying the pipeline without a broker"""
+
+    SYMBOLS = ('EURUSD', 'GBPUSD', 'USDJPY', 'XAUUSD', 'BTCUSD', 'ETHUSD', 'AAPL', 'TSLA')
+
+    def __init__(self, buffer, rate=2000, symbols=SYMBOLS, seed=None):
+        super().__init__(name="SimulatedFeed", daemon=True)
+        self.buffer = buffer
+        # Ticks per second across all symbols
+        self.rate = rate
+        self.symbols = list(symbols)
+        self.rng = random.Random(seed)
+        self.prices = {symbol: self.rng.uniform(1, 2000) for symbol in self.symbols}
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """Push ticks in small bursts at the configured rate"""
+        burst = max(1, self.rate // 100)
+        interval = burst / self.rate
+        next_burst = time.perf_counter()
+        rng = self.rng
+        while not self.stop_event.is_set():
+            for _ in range(burst):
+                symbol = rng.choice(self.symbols)
+                price = self.prices[symbol] * (1 + rng.gauss(0, 0.0005))
+                self.prices[symbol] = price
+                if not self.buffer.push(symbol, price):
+                    # Backpressure: skip ahead rather than flood the UI
+                    self.buffer.throttled += 1
+                    break
+            next_burst += interval
+            delay = next_burst - time.perf_counter()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                next_burst = time.perf_counter()
+
+    def stop(self):
+        """Stop producing and wait for the thread to end"""
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+def main(argv=None):
+    """Measure ingestion with a consumer draining at a fixed frame rate"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MR Trade tick pipeline benchmark")
+    parser.add_argument('--rate', type=int, default=5000, help="ticks per second")
+    parser.add_argument('--fps', type=int, default=60, help="consumer drains per second")
+    parser.add_argument('--seconds', type=float, default=3.0, help="how long to run")
+    args = parser.parse_args(argv)
+
+    buffer = TickBuffer()
+    feed = SimulatedFeed(buffer, rate=args.rate, seed=1)
+    feed.start()
+    drain_times = []
+    end = time.perf_counter() + args.seconds
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        buffer.drain_latest()
+        drain_times.append(time.perf_counter() - start)
+        time.sleep(1 / args.fps)
+    feed.stop()
+
+    stats = buffer.stats()
+    drain_times.sort()
+    print(f"{stats['pushed'] / args.seconds:.0f} ticks/s pushed over {args.seconds:g} s")
+    for name in ('drained', 'coalesced', 'dropped', 'throttled', 'peak_fill'):
+        print(f"  {name:<10} {stats[name]}")
+    print(f"  drain p50 {drain_times[len(drain_times) // 2] * 1e6:.0f} us, "
+          f"max {drain_times[-1] * 1e6:.0f} us per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+import json
+import mmap
+import os
+import struct
+import time
+
+from atomic_files import write_atomic
+from trades import TradeStore, format_price, load_trades
+
+
+# Extension that selects the binary log over JSON trade files
+TRADE_LOG_EXTENSION = ".mrt"
+
+
+class TradeLog:
+    """Fixed-width binary trade history read through a memory map
+
+    The file is a 32 byte header followed by 32 byte records in time
+    order; symbol names live in a JSON sidecar so a record only holds a
+    symbol id. Opening reads the header and every BLOCK-th timestamp, so
+    it takes the same time for a day of trades as for years of them, and
+    rows are decoded from the map only when they are asked for.
+
+    The record count in the header is updated after the records are
+    durably written, so records past it, torn by a crash, are ignored
+    and overwritten by the next append.
+    """
+
+    MAGIC = b"MRTLOG01"
+    # magic, format version, record size, record count
+    HEADER = struct.Struct('<8sIIQ8x')
+    # time, price, quantity, symbol id, side
+    RECORD = struct.Struct('<dddIb3x')
+    VERSION = 1
+    # Records per entry in the sparse time index
+    BLOCK = 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.symbols_file = path + ".symbols"
+        self.map = None
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.RECORD.size, 0))
+        self.file = open(path, 'r+b')
+        self.symbols = self.read_symbols()
+        self.symbol_ids_by_name = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.open_map()
+
+    def read_symbols(self):
+        """Read the symbol names sidecar"""
+        try:
+            with open(self.symbols_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def write_symbols(self):
+        """Replace the symbol names sidecar"""
+        write_atomic(self.symbols_file, json.dumps(self.symbols))
+
+    def open_map(self):
+        """Map the file and rebuild the sparse time index"""
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or version != self.VERSION or record_size != self.RECORD.size:
+            self.close()
+            raise ValueError(f"{self.path} is not a trade log")
+        self.count = min(count, (len(self.map) - self.HEADER.size) // self.RECORD.size)
+        # Time of every BLOCK-th record, so searches touch few pages
+        self.block_times = array('d', (self.time_at(row) for row in range(0, self.count, self.BLOCK)))
+
+    def close_map(self):
+        """Unmap the file"""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def refresh(self):
+        """Pick up records another process appended"""
+        size = os.path.getsize(self.path)
+        if size != len(self.map):
+            self.close_map()
+            self.symbols = self.read_symbols()
+            self.symbol_ids_by_name = {symbol: i for i, symbol in enumerate(self.symbols)}
+            self.open_map()
+
+    def __len__(self):
+        return self.count
+
+    def offset(self, row):
+        """Return the file offset of a record"""
+        return self.HEADER.size + row * self.RECORD.size
+
+    def time_at(self, row):
+        """Return the time of a record without decoding the rest"""
+        return struct.unpack_from('<d', self.map, self.offset(row))[0]
+
+    def record(self, row):
+        """Return (time, price, quantity, symbol id, side) for a record"""
+        return self.RECORD.unpack_from(self.map, self.offset(row))
+
+    def trade(self, row):
+        """Return one record as a trade dict"""
+        timestamp, price, quantity, symbol_id, side = self.record(row)
+        return {
+            'time': timestamp,
+            'symbol': self.symbols[symbol_id],
+            'side': TradeStore.SIDE_NAMES[side].lower(),
+            'price': price,
+            'quantity': quantity,
+        }
+
+    def page(self, start, stop):
+        """Decode records start..stop straight from the map"""
+        start = max(0, start)
+        stop = min(self.count, stop)
+        if start >= stop:
+            return []
+        view = memoryview(self.map)[self.offset(start):self.offset(stop)]
+        try:
+            return list(self.RECORD.iter_unpack(view))
+        finally:
+            view.release()
+
+    def iter_trades(self, start=0, stop=None):
+        """Yield trade dicts for a range of records"""
+        stop = self.count if stop is None else min(stop, self.count)
+        for row in range(start, stop):
+            yield self.trade(row)
+
+    def search_time(self, timestamp):
+        """Return the first row whose time is at or after timestamp"""
+        # The sparse index narrows the search to one block
+        block = bisect_left(self.block_times, timestamp)
+        lo = max(0, (block - 1) * self.BLOCK)
+        hi = min(self.count, block * self.BLOCK)
+        return bisect_left(range(lo, hi), timestamp, key=self.time_at) + lo
+
+    def window(self, start=None, end=None):
+        """Return the rows with start <= time < end as a range"""
+        lo = 0 if start is None else self.search_time(start)
+        hi = self.count if end is None else self.search_time(end)
+        return range(lo, hi)
+
+    def append_many(self, trades):
+        """Durably append trades, which must not be older than the last one"""
+        records = []
+        last_time = self.time_at(self.count - 1) if self.count else float('-inf')
+        new_symbols = False
+        for trade in trades:
+            if trade['time'] < last_time:
+                raise ValueError("trades must be appended in time order")
+            last_time = trade['time']
+            symbol_id = self.symbol_ids_by_name.get(trade['symbol'])
+            if symbol_id is None:
+                symbol_id = len(self.symbols)
+                self.symbols.append(trade['symbol'])
+                self.symbol_ids_by_name[trade['symbol']] = symbol_id
+                new_symbols = True
+            records.append(self.RECORD.pack(
+                trade['time'], trade['price'], trade['quantity'], symbol_id,
+                TradeStore.SIDES.get(trade['side'], 0),
+            ))
+        if not records:
+            return 0
+        # Names first, so no stored record refers to an unknown symbol
+        if new_symbols:
+            self.write_symbols()
+
+        count = self.count + len(records)
+        # Windows cannot grow a file while it is mapped
+        self.close_map()
+        self.file.seek(self.offset(self.count))
+        self.file.write(b"".join(records))
+        self.file.truncate()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.seek(0)
+        self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.RECORD.size, count))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.open_map()
+        return len(records)
+
+    def format_row(self, row):
+        """Return display strings for one record"""
+        timestamp, price, quantity, symbol_id, side = self.record(row)
+        return (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)),
+            self.symbols[symbol_id],
+            TradeStore.SIDE_NAMES[side],
+            format_price(price),
+            f"{quantity:,.4g}",
+        )
+
+    def close(self):
+        """Unmap and close the file"""
+        self.close_map()
+        self.file.close()
+
+
+def trade_key(trade):
+    """Return what a trade is stored as, for spotting ones already imported"""
+    return (float(trade['time']), trade['symbol'], TradeStore.SIDES.get(trade['side'], 0),
+            float(trade['price']), float(trade['quantity']))
+
+
+def import_json(json_file, log_file, batch_size=10000):
+    """Append the trades of a JSON trade file that the log does not hold yet
+
+    Trades older than the log's last one were imported before. Trades at
+    its last timestamp are matched against the ones stored there, so a
+    trade sharing that timestamp is only skipped if it is already stored.
+    """
+    log = TradeLog(log_file)
+    try:
+        trades = load_trades(json_file)
+        if len(log):
+            last_time = log.time_at(len(log) - 1)
+            stored = Counter(trade_key(trade)
+                             for trade in log.iter_trades(log.search_time(last_time)))
+            new_trades = []
+            for trade in trades:
+                if trade['time'] < last_time:
+                    continue
+                if trade['time'] == last_time and stored[trade_key(trade)]:
+                    stored[trade_key(trade)] -= 1
+                    continue
+                new_trades.append(trade)
+            trades = new_trades
+        for start in range(0, len(trades), batch_size):
+            log.append_many(trades[start:start + batch_size])
+        return len(trades)
+    finally:
+        log.close()
+
+
+def export_json(log_file, json_file):
+    """Write every trade in a binary log to a JSON trade file"""
+    log = TradeLog(log_file)
+    try:
+        with open(json_file, 'w') as f:
+            f.write("[\n")
+            for row, trade in enumerate(log.iter_trades()):
+                f.write((",\n" if row else "") + json.dumps(trade))
+            f.write("\n]\n")
+        return len(log)
+    finally:
+        log.close()
+
+
+def main(argv=None):
+    """Command line converter between JSON trade files and binary logs"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MR Trade binary trade log tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="append a JSON trade file to a log")
+    import_parser.add_argument('json_file', help="e.g. bot_1_2_trades.json")
+    import_parser.add_argument('log_file', help="e.g. bot_1_2_trades.mrt")
+
+    export_parser = commands.add_parser('export', help="write a log as a JSON trade file")
+    export_parser.add_argument('log_file')
+    export_parser.add_argument('json_file')
+
+    info_parser = commands.add_parser('info', help="show what a log holds")
+    info_parser.add_argument('log_file')
+
+    args = parser.parse_args(argv)
+    if args.command == 'import':
+        count = import_json(args.json_file, args.log_file)
+        print(f"Appended {count} trades from {args.json_file} to {args.log_file}")
+
+    elif args.command == 'export':
+        count = export_json(args.log_file, args.json_file)
+        print(f"Exported {count} trades from {args.log_file} to {args.json_file}")
+
+    elif args.command == 'info':
+        start = time.perf_counter()
+        log = TradeLog(args.log_file)
+        opened = time.perf_counter() - start
+        try:
+            print(f"{len(log)} trades, {len(log.symbols)} symbols, opened in {opened * 1000:.1f} ms")
+            if len(log):
+                first, last = log.format_row(0)[0], log.format_row(len(log) - 1)[0]
+                print(f"from {first} to {last}")
+        finally:
+            log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import threading
+
+from kivy.clock import Clock
+from kivy.graphics import Color, Line, Mesh
+from kivy.metrics import dp
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.widget import Widget
+
+from charts import SeriesPyramid, price_series
+from trades import TRADE_COLUMNS, format_price
+
+
+ROW_HEIGHT = dp(32)
+# Rows handed to the RecycleView at once when paging through a trade log
+LOG_PAGE_SIZE = 5000
+
+
+class TradeRow(RecycleDataViewBehavior, BoxLayout):
+    """One visible table row, reused for whichever trade scrolls into view"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.row = 0
+        self.cells = []
+        for _ in TRADE_COLUMNS:
+            cell = Label(color=(0, 0, 0, 1), font_size=dp(14), halign="center")
+            self.cells.append(cell)
+            self.add_widget(cell)
+
+    def refresh_view_attrs(self, rv, index, data):
+        """Fill the cells for the trade at this position"""
+        # Rows are formatted here, only while visible, not when loaded
+        for cell, text in zip(self.cells, rv.table.format_row(data['row'])):
+            cell.text = text
+        return super().refresh_view_attrs(rv, index, data)
+
+
+class TradeRowsView(BoxLayout):
+    """Column headings over a RecycleView of trade rows"""
+
+    def __init__(self, table, **kwargs):
+        super().__init__(orientation="vertical", **kwargs)
+        self.table = table
+
+        self.header = BoxLayout(size_hint_y=None, height=ROW_HEIGHT)
+        self.header_buttons = {}
+        for name, heading, _ in TRADE_COLUMNS:
+            button = Button(
+                text=heading,
+                background_normal="",
+                background_color=(0.1, 0.1, 0.1, 1),
+                font_size=dp(14),
+            )
+            button.bind(on_release=lambda instance, name=name: self.sort_by(name))
+            self.header_buttons[name] = button
+            self.header.add_widget(button)
+        self.add_widget(self.header)
+
+        self.rv = RecycleView(viewclass=TradeRow, bar_width=dp(8), scroll_type=['bars', 'content'])
+        self.rv.table = table
+        layout = RecycleBoxLayout(
+            orientation="vertical",
+            default_size=(None, ROW_HEIGHT),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.rv.add_widget(layout)
+        self.add_widget(self.rv)
+
+    def show_sort(self, sort_column, descending):
+        """Mark the sorted column's heading with the sort direction"""
+        for name, heading, _ in TRADE_COLUMNS:
+            if name == sort_column:
+                heading += " v" if descending else " ^"
+            self.header_buttons[name].text = heading
+
+    def sort_by(self, column):
+        """Called when a column heading is tapped"""
+
+
+class TradeTableView(TradeRowsView):
+    """Sortable trade table that only creates widgets for visible rows"""
+
+    def __init__(self, table, **kwargs):
+        super().__init__(table, **kwargs)
+        # One small dict per trade; sorting reorders references to them
+        self.row_data = [{'row': row} for row in range(len(table))]
+        self.refresh()
+
+    def refresh(self):
+        """Show every row in the table's current order"""
+        row_data = self.row_data
+        self.rv.data = [row_data[row] for row in self.table.view_order()]
+        self.show_sort(self.table.sort_column, self.table.descending)
+
+    def sort_by(self, column):
+        """Sort by column, or flip the direction if it is already sorted by it"""
+        self.table.set_sort(column)
+        self.refresh()
+
+
+class TradeLogView(TradeRowsView):
+    """Pages through a memory-mapped trade log in time order
+
+    Only one page of rows is handed to the RecycleView, and rows are
+    decoded from the map as they scroll into view, so a log of any size
+    opens at once. Tapping the Time heading flips between newest first
+    and oldest first.
+    """
+
+    def __init__(self, log, page_size=LOG_PAGE_SIZE, **kwargs):
+        super().__init__(log, **kwargs)
+        self.page_size = page_size
+        self.descending = True
+        self.page_start = 0
+
+        footer = BoxLayout(size_hint_y=None, height=ROW_HEIGHT)
+        for text, action in (("<<", self.first_page), ("<", self.previous_page),
+                             (">", self.next_page), (">>", self.last_page)):
+            button = Button(text=text, size_hint_x=None, width=dp(48), font_size=dp(14))
+            button.bind(on_release=lambda instance, action=action: action())
+            footer.add_widget(button)
+        self.page_label = Label(color=(0, 0, 0, 1), font_size=dp(13))
+        footer.add_widget(self.page_label)
+        self.add_widget(footer)
+        self.show_page()
+
+    def show_page(self):
+        """Show the rows of the current page"""
+        count = len(self.table)
+        self.page_start = max(0, min(self.page_start, count - 1))
+        stop = min(self.page_start + self.page_size, count)
+        if self.descending:
+            rows = range(count - 1 - self.page_start, count - 1 - stop, -1)
+        else:
+            rows = range(self.page_start, stop)
+        self.rv.data = [{'row': row} for row in rows]
+        self.rv.scroll_y = 1
+        self.page_label.text = (f"{self.page_start + 1:,}-{stop:,} of {count:,}" if count
+                                else "No trades")
+        self.show_sort('time', self.descending)
+
+    def sort_by(self, column):
+        """Only time order can be shown without reading the whole log"""
+        if column == 'time':
+            self.descending = not self.descending
+            self.page_start = 0
+            self.show_page()
+
+    def first_page(self):
+        """Show the newest, or oldest, trades"""
+        self.page_start = 0
+        self.show_page()
+
+    def previous_page(self):
+        """Show the page before this one"""
+        self.page_start -= self.page_size
+        self.show_page()
+
+    def next_page(self):
+        """Show the page after this one"""
+        if self.page_start + self.page_size < len(self.table):
+            self.page_start += self.page_size
+            self.show_page()
+
+    def last_page(self):
+        """Show the far end of the log"""
+        self.page_start = (len(self.table) - 1) // self.page_size * self.page_size
+        self.show_page()
+
+
+class TickerBar(BoxLayout):
+    """Latest price per symbol plus the tick pipeline counters"""
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="vertical", size_hint_y=None, height=dp(56), **kwargs)
+        self.prices = BoxLayout()
+        self.price_labels = {}
+        self.add_widget(self.prices)
+        self.stats_label = Label(color=(0.4, 0.4, 0.4, 1), font_size=dp(11),
+                                 size_hint_y=None, height=dp(18))
+        self.add_widget(self.stats_label)
+
+    def update(self, latest, stats):
+        """Show the newest ticks; only symbols that ticked are touched"""
+        for symbol, (_, price, _) in latest.items():
+            label = self.price_labels.get(symbol)
+            if label is None:
+                label = Label(color=(0, 0, 0, 1), font_size=dp(13))
+                self.price_labels[symbol] = label
+                self.prices.add_widget(label)
+            label.text = f"{symbol}\n{format_price(price)}"
+        self.stats_label.text = (
+            f"ticks {stats['pushed']}  shown {stats['drained'] - stats['coalesced']}  "
+            f"coalesced {stats['coalesced']}  dropped {stats['dropped']}  "
+            f"throttled {stats['throttled']}  buffered {stats['buffered']}/{stats['capacity']}"
+        )
+
+
+class PriceChart(Widget):
+    """Price line for one symbol, drawn straight onto the canvas
+
+    The series is reduced to one point per pixel with LTTB from a
+    SeriesPyramid, so a redraw only uploads a line and a fill strip of
+    about the chart's width whatever the series length. Drag to pan and
+    use the mouse wheel to zoom.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pyramid = None
+        self.x_min = self.x_max = 0.0
+        with self.canvas:
+            Color(0.1, 0.1, 0.1, 0.08)
+            self.fill = Mesh(mode="triangle_strip")
+            Color(0.1, 0.1, 0.1, 1)
+            # Thin lines avoid Kivy's tessellated smooth lines
+            self.line = Line(width=1)
+        self.label = Label(color=(0.3, 0.3, 0.3, 1), font_size=dp(12), halign="left")
+        self.add_widget(self.label)
+        self.redraw_trigger = Clock.create_trigger(self.redraw)
+        self.bind(pos=self.redraw_trigger, size=self.redraw_trigger)
+
+    def show_symbol(self, trades, symbol):
+        """Build the chart for symbol in the background, then draw it"""
+        self.label.text = f"{symbol}  loading..."
+
+        def build():
+            pyramid = SeriesPyramid(*price_series(trades, symbol))
+            Clock.schedule_once(lambda dt: self.set_pyramid(pyramid, symbol))
+
+        threading.Thread(target=build, name="PriceChart", daemon=True).start()
+
+    def set_pyramid(self, pyramid, symbol):
+        """Show a freshly built series, zoomed out fully"""
+        self.pyramid = pyramid
+        self.x_min, self.x_max = pyramid.x_range()
+        self.label.text = f"{symbol}  {len(pyramid):,} trades"
+        self.redraw_trigger()
+
+    def redraw(self, *args):
+        """Replace the line and fill with the visible part of the series"""
+        self.label.pos = (self.x + dp(8), self.top - dp(20))
+        self.label.size = (self.width, dp(20))
+        self.label.text_size = self.label.size
+        if self.pyramid is None or len(self.pyramid) < 2 or self.width < 3:
+            self.line.points = []
+            self.fill.vertices = []
+            self.fill.indices = []
+            return
+
+        xs, ys = self.pyramid.view(self.x_min, self.x_max, self.width)
+        y_min, y_max = min(ys), max(ys)
+        x_scale = self.width / ((self.x_max - self.x_min) or 1)
+        y_scale = (self.height - dp(24)) / ((y_max - y_min) or 1)
+        left, bottom = self.x, self.y
+
+        points = []
+        vertices = []
+        for x, y in zip(xs, ys):
+            px = left + (x - self.x_min) * x_scale
+            py = bottom + (y - y_min) * y_scale
+            points += (px, py)
+            vertices += (px, py, 0, 0, px, bottom, 0, 0)
+        self.line.points = points
+        self.fill.vertices = vertices
+        self.fill.indices = list(range(len(vertices) // 4))
+
+    def clamp_view(self, span):
+        """Keep a span-wide view inside the series"""
+        first, last = self.pyramid.x_range()
+        span = min(span, last - first)
+        self.x_min = max(first, min(self.x_min, last - span))
+        self.x_max = self.x_min + span
+
+    def on_touch_down(self, touch):
+        if self.pyramid is None or not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+        span = self.x_max - self.x_min
+        if touch.is_mouse_scrolling:
+            # Zoom around the point under the cursor
+            factor = 0.8 if touch.button == "scrolldown" else 1.25
+            anchor = self.x_min + (touch.x - self.x) / self.width * span
+            self.x_min = anchor - (anchor - self.x_min) * factor
+            self.clamp_view(span * factor)
+            self.redraw_trigger()
+            return True
+        touch.grab(self)
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_move(touch)
+        span = self.x_max - self.x_min
+        self.x_min -= touch.dx / self.width * span
+        self.clamp_view(span)
+        self.redraw_trigger()
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_up(touch)
+        touch.ungrab(self)
+        return True
@@ -0,0 +1,435 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+import json
+import os
+import random
+import time
+
+try:
+    import numpy
+except ImportError:
+    # Aggregates fall back to plain Python loops
+    numpy = None
+
+
+# Default trade history file written by the trading bot
+DEFAULT_TRADES_FILE = "bot_1_2_trades.json"
+
+# Column name, heading, alternative keys found in trade files
+TRADE_COLUMNS = (
+    ('time', "Time", ('timestamp', 'date', 'datetime')),
+    ('symbol', "Symbol", ('pair', 'instrument', 'market')),
+    ('side', "Side", ('type', 'action', 'direction')),
+    ('price', "Price", ('rate', 'entry_price')),
+    ('quantity', "Quantity", ('qty', 'amount', 'size', 'volume')),
+)
+COLUMN_NAMES = tuple(name for name, _, _ in TRADE_COLUMNS)
+
+
+def parse_time(value):
+    """Convert an epoch number or ISO date string to epoch seconds"""
+    if isinstance(value, (int, float)):
+        # Millisecond timestamps are common in exchange exports
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def normalize_trade(raw):
+    """Map a trade dict using any known key names onto TRADE_COLUMNS"""
+    trade = {}
+    for name, _, aliases in TRADE_COLUMNS:
+        value = raw.get(name)
+        for alias in aliases:
+            if value is not None:
+                break
+            value = raw.get(alias)
+        trade[name] = value
+    trade['time'] = parse_time(trade['time'] or 0)
+    trade['symbol'] = str(trade['symbol'] or "")
+    trade['side'] = str(trade['side'] or "").lower()
+    for name in ('price', 'quantity'):
+        try:
+            trade[name] = float(trade[name] or 0)
+        except (TypeError, ValueError):
+            trade[name] = 0.0
+    return trade
+
+
+def load_trades(path=DEFAULT_TRADES_FILE):
+    """Read trades from a JSON list (or {"trades": [...]}), oldest first"""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if isinstance(data, dict):
+        data = data.get('trades', [])
+    trades = [normalize_trade(raw) for raw in data if isinstance(raw, dict)]
+    trades.sort(key=lambda trade: trade['time'])
+    return trades
+
+
+def generate_trades(count, start=None, seed=None):
+    """Make plausible random trades for demos and benchmarks"""
+    rng = random.Random(seed)
+    symbols = ['EURUSD', 'GBPUSD', 'USDJPY', 'XAUUSD', 'BTCUSD', 'ETHUSD', 'AAPL', 'TSLA']
+    prices = {symbol: rng.uniform(1, 2000) for symbol in symbols}
+    now = time.time() if start is None else start
+    trades = []
+    for i in range(count):
+        symbol = rng.choice(symbols)
+        prices[symbol] *= 1 + rng.gauss(0, 0.001)
+        trades.append({
+            'time': now + i,
+            'symbol': symbol,
+            'side': rng.choice(('buy', 'sell')),
+            'price': prices[symbol],
+            'quantity': round(rng.uniform(0.01, 10), 2),
+        })
+    return trades
+
+
+def format_price(price):
+    """Show cents for large prices and pips for small ones"""
+    return f"{price:,.2f}" if price >= 100 else f"{price:.5f}"
+
+
+class TradeStore:
+    """Trades held in typed arrays, one per field
+
+    A trade costs 29 bytes: float64 time, price and quantity, a uint32
+    symbol id and an int8 side (1 buy, -1 sell, 0 unknown). Appends are
+    amortized O(1). Aggregates run vectorized on NumPy views of the arrays
+    when NumPy is installed, and in plain Python otherwise.
+    """
+
+    SIDES = {'buy': 1, 'long': 1, 'sell': -1, 'short': -1}
+    SIDE_NAMES = {1: "BUY", -1: "SELL", 0: ""}
+
+    def __init__(self, trades=()):
+        self.times = array('d')
+        self.prices = array('d')
+        self.quantities = array('d')
+        self.symbol_ids = array('I')
+        self.sides = array('b')
+        # symbol id -> name, and back
+        self.symbols = []
+        self.symbol_ids_by_name = {}
+        # Lets time windows be found by binary search
+        self.time_sorted = True
+        self.extend(trades)
+
+    def __len__(self):
+        return len(self.times)
+
+    def symbol_id(self, symbol):
+        """Return the id for a symbol name, assigning one if it is new"""
+        symbol_id = self.symbol_ids_by_name.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            self.symbol_ids_by_name[symbol] = symbol_id
+        return symbol_id
+
+    def append(self, trade):
+        """Add one trade and return its row number"""
+        timestamp = trade['time']
+        if self.times and timestamp < self.times[-1]:
+            self.time_sorted = False
+        self.times.append(timestamp)
+        self.prices.append(trade['price'])
+        self.quantities.append(trade['quantity'])
+        self.symbol_ids.append(self.symbol_id(trade['symbol']))
+        self.sides.append(self.SIDES.get(trade['side'], 0))
+        return len(self.times) - 1
+
+    def extend(self, trades):
+        """Add many trades"""
+        for trade in trades:
+            self.append(trade)
+
+    def row(self, row):
+        """Return one trade as a dict"""
+        return {
+            'time': self.times[row],
+            'symbol': self.symbols[self.symbol_ids[row]],
+            'side': self.SIDE_NAMES[self.sides[row]].lower(),
+            'price': self.prices[row],
+            'quantity': self.quantities[row],
+        }
+
+    def nbytes(self):
+        """Return the memory held by the trade arrays"""
+        return sum(values.itemsize * len(values) for values in
+                   (self.times, self.prices, self.quantities, self.symbol_ids, self.sides))
+
+    def window(self, start=None, end=None):
+        """Return the rows with start <= time < end
+
+        A range(lo, hi) when times are in order, otherwise a list of rows.
+        """
+        times = self.times
+        if self.time_sorted:
+            lo = 0 if start is None else bisect_left(times, start)
+            hi = len(times) if end is None else bisect_left(times, end)
+            return range(lo, hi)
+        return [row for row in range(len(times))
+                if (start is None or times[row] >= start) and (end is None or times[row] < end)]
+
+    def selection(self, start, end, symbol):
+        """Return NumPy time, price, quantity and symbol id arrays for a window"""
+        if not len(self):
+            empty = numpy.zeros(0)
+            return empty, empty, empty, numpy.zeros(0, dtype=numpy.uint32)
+        times = numpy.frombuffer(self.times, dtype=numpy.float64)
+        prices = numpy.frombuffer(self.prices, dtype=numpy.float64)
+        quantities = numpy.frombuffer(self.quantities, dtype=numpy.float64)
+        symbol_ids = numpy.frombuffer(self.symbol_ids, dtype=numpy.uint32)
+        rows = self.window(start, end)
+        if isinstance(rows, range):
+            selected = slice(rows.start, rows.stop)
+        else:
+            selected = numpy.asarray(rows, dtype=numpy.int64)
+        # Views into the arrays; callers turn results into Python objects
+        # before returning, so the arrays are free to grow again afterwards
+        times, prices = times[selected], prices[selected]
+        quantities, symbol_ids = quantities[selected], symbol_ids[selected]
+        if symbol is not None:
+            symbol_id = self.symbol_ids_by_name.get(symbol)
+            if symbol_id is None:
+                mask = numpy.zeros(len(times), dtype=bool)
+            else:
+                mask = symbol_ids == symbol_id
+            times, prices, quantities, symbol_ids = (
+                times[mask], prices[mask], quantities[mask], symbol_ids[mask]
+            )
+        return times, prices, quantities, symbol_ids
+
+    def selected_rows(self, start, end, symbol):
+        """Return the rows in a window, optionally for one symbol only"""
+        rows = self.window(start, end)
+        if symbol is None:
+            return rows
+        symbol_id = self.symbol_ids_by_name.get(symbol)
+        symbol_ids = self.symbol_ids
+        return [row for row in rows if symbol_ids[row] == symbol_id]
+
+    def ohlc(self, interval, start=None, end=None, symbol=None):
+        """Return (bar start, open, high, low, close, volume) bars
+
+        Bars are interval seconds wide and aligned to multiples of it;
+        intervals without trades are left out.
+        """
+        if numpy is not None:
+            times, prices, quantities, _ = self.selection(start, end, symbol)
+            if not len(times):
+                return []
+            if not self.time_sorted:
+                order = numpy.argsort(times, kind='stable')
+                times, prices, quantities = times[order], prices[order], quantities[order]
+            buckets = numpy.floor(times / interval) * interval
+            starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(buckets)) + 1))
+            ends = numpy.append(starts[1:], len(times)) - 1
+            return list(zip(
+                buckets[starts].tolist(),
+                prices[starts].tolist(),
+                numpy.maximum.reduceat(prices, starts).tolist(),
+                numpy.minimum.reduceat(prices, starts).tolist(),
+                prices[ends].tolist(),
+                numpy.add.reduceat(quantities, starts).tolist(),
+            ))
+
+        rows = self.selected_rows(start, end, symbol)
+        if not self.time_sorted:
+            rows = sorted(rows, key=self.times.__getitem__)
+        bars = []
+        for row in rows:
+            price = self.prices[row]
+            bucket = (self.times[row] // interval) * interval
+            if bars and bars[-1][0] == bucket:
+                bar = bars[-1]
+                bar[2] = max(bar[2], price)
+                bar[3] = min(bar[3], price)
+                bar[4] = price
+                bar[5] += self.quantities[row]
+            else:
+                bars.append([bucket, price, price, price, price, self.quantities[row]])
+        return [tuple(bar) for bar in bars]
+
+    def vwap(self, start=None, end=None, symbol=None):
+        """Return the volume-weighted average price, or None without volume"""
+        if numpy is not None:
+            _, prices, quantities, _ = self.selection(start, end, symbol)
+            volume = quantities.sum()
+            return float(prices @ quantities / volume) if volume else None
+
+        notional = volume = 0.0
+        prices, quantities = self.prices, self.quantities
+        for row in self.selected_rows(start, end, symbol):
+            notional += prices[row] * quantities[row]
+            volume += quantities[row]
+        return notional / volume if volume else None
+
+    def symbol_totals(self, start=None, end=None):
+        """Return {symbol: (trades, quantity, notional)} for a time window"""
+        if numpy is not None:
+            _, prices, quantities, symbol_ids = self.selection(start, end, None)
+            size = len(self.symbols)
+            counts = numpy.bincount(symbol_ids, minlength=size)
+            volumes = numpy.bincount(symbol_ids, weights=quantities, minlength=size)
+            notionals = numpy.bincount(symbol_ids, weights=prices * quantities, minlength=size)
+            return {
+                self.symbols[symbol_id]: (int(counts[symbol_id]), float(volumes[symbol_id]),
+                                          float(notionals[symbol_id]))
+                for symbol_id in numpy.flatnonzero(counts).tolist()
+            }
+
+        totals = {}
+        prices, quantities, symbol_ids = self.prices, self.quantities, self.symbol_ids
+        for row in self.window(start, end):
+            symbol_id = symbol_ids[row]
+            count, volume, notional = totals.get(symbol_id, (0, 0.0, 0.0))
+            totals[symbol_id] = (count + 1, volume + quantities[row],
+                                 notional + prices[row] * quantities[row])
+        return {self.symbols[symbol_id]: total for symbol_id, total in totals.items()}
+
+
+class TradeTable(TradeStore):
+    """Trade store with cached sort orders for the table view
+
+    The order for a column is computed once, when the table is first
+    sorted by it, and afterwards kept up to date by binary insertion as
+    trades arrive. Ties keep arrival order.
+    """
+
+    def __init__(self, trades=()):
+        # column -> row numbers in ascending order of that column
+        self.sort_indexes = {}
+        self.sort_column = 'time'
+        self.descending = True
+        super().__init__(trades)
+
+    def sort_key(self, column):
+        """Return the key that orders row numbers by a column"""
+        if column == 'symbol':
+            names, symbol_ids = self.symbols, self.symbol_ids
+            return lambda row: (names[symbol_ids[row]], row)
+        values = {
+            'time': self.times,
+            'side': self.sides,
+            'price': self.prices,
+            'quantity': self.quantities,
+        }[column]
+        return lambda row: (values[row], row)
+
+    def sort_index(self, column):
+        """Return row numbers in ascending order of column"""
+        index = self.sort_indexes.get(column)
+        if index is None:
+            index = array('I', sorted(range(len(self)), key=self.sort_key(column)))
+            self.sort_indexes[column] = index
+        return index
+
+    def set_sort(self, column, descending=None):
+        """Sort by column; picking the current column again flips direction"""
+        if descending is None:
+            descending = not self.descending if column == self.sort_column else False
+        self.sort_column = column
+        self.descending = descending
+        self.sort_index(column)
+
+    def view_order(self):
+        """Return row numbers in the order they are displayed"""
+        index = self.sort_index(self.sort_column)
+        return index[::-1] if self.descending else index
+
+    def append(self, trade):
+        """Add one trade and return its display position"""
+        row = super().append(trade)
+        position = None
+        for column, index in self.sort_indexes.items():
+            key = self.sort_key(column)
+            at = bisect_left(index, key(row), key=key)
+            index.insert(at, row)
+            if column == self.sort_column:
+                position = at
+        if position is None:
+            key = self.sort_key(self.sort_column)
+            position = bisect_left(self.sort_index(self.sort_column), key(row), key=key)
+        return len(self) - 1 - position if self.descending else position
+
+    def extend(self, trades):
+        """Add many trades, re-sorting cached orders once instead of per row"""
+        first = len(self)
+        for trade in trades:
+            TradeStore.append(self, trade)
+        if len(self) == first:
+            return
+        # Timsort merges the already sorted run with the new rows cheaply
+        for column, index in self.sort_indexes.items():
+            index.extend(range(first, len(self)))
+            self.sort_indexes[column] = array('I', sorted(index, key=self.sort_key(column)))
+
+    def format_row(self, row):
+        """Return display strings for one row"""
+        return (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.times[row])),
+            self.symbols[self.symbol_ids[row]],
+            self.SIDE_NAMES[self.sides[row]],
+            format_price(self.prices[row]),
+            f"{self.quantities[row]:,.4g}",
+        )
+
+
+def main(argv=None):
+    """Time table operations on generated trade history"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MR Trade trade table benchmark")
+    parser.add_argument('--rows', type=int, default=100000, help="trades to generate")
+    parser.add_argument('--inserts', type=int, default=1000, help="trades appended one by one")
+    args = parser.parse_args(argv)
+
+    trades = generate_trades(args.rows + args.inserts, seed=1)
+    start = time.perf_counter()
+    table = TradeTable(trades[:args.rows])
+    print(f"load {args.rows} rows: {(time.perf_counter() - start) * 1000:8.1f} ms")
+    for column in COLUMN_NAMES:
+        start = time.perf_counter()
+        table.set_sort(column)
+        table.view_order()
+        print(f"sort by {column:<9} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    start = time.perf_counter()
+    for trade in trades[args.rows:]:
+        table.append(trade)
+    elapsed = time.perf_counter() - start
+    print(f"append one row: {elapsed / max(args.inserts, 1) * 1e6:8.1f} us "
+          f"({len(table.sort_indexes)} sort orders kept)")
+
+    print(f"trade arrays: {table.nbytes() / len(table):.0f} bytes per trade; aggregates "
+          f"{'with NumPy' if numpy is not None else 'in plain Python (NumPy not installed)'}")
+    middle = table.times[len(table) // 2]
+    for label, aggregate in (
+        ("OHLC 1 min bars", lambda: table.ohlc(60)),
+        ("OHLC one symbol", lambda: table.ohlc(60, symbol=table.symbols[0])),
+        ("VWAP", lambda: table.vwap()),
+        ("VWAP second half", lambda: table.vwap(start=middle)),
+        ("symbol totals", lambda: table.symbol_totals()),
+    ):
+        start = time.perf_counter()
+        aggregate()
+        print(f"{label:<16} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()